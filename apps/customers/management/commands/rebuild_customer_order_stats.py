@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.customers.stats import rebuild_customer_order_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-customer order count, lifetime spend and last order date"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help="Only report customers whose stats have drifted, without repairing them",
+        )
+
+    def handle(self, *args, **options):
+        drifted = rebuild_customer_order_stats(fix=not options['verify'])
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Customer order stats are up to date"))
+            return
+
+        ids = ', '.join(str(pk) for pk in sorted(drifted))
+        if options['verify']:
+            raise CommandError(f"{len(drifted)} customers' order stats have drifted: {ids}")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt order stats for {len(drifted)} customers: {ids}"))
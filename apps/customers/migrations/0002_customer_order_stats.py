@@ -0,0 +1,47 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Q, Sum
+
+
+def backfill_customer_order_stats(apps, schema_editor):
+    Customer = apps.get_model('customers', 'Customer')
+    CustomerOrderStats = apps.get_model('customers', 'CustomerOrderStats')
+    Order = apps.get_model('orders', 'Order')
+
+    stats = {pk: CustomerOrderStats(customer_id=pk) for pk in Customer.objects.values_list('id', flat=True)}
+    counted = ~Q(status='cancelled')
+    totals = Order.objects.values('customer_id').annotate(
+        order_count=Count('id', filter=counted),
+        total_spent=Sum('total_amount', filter=counted),
+        last_order_at=Max('order_date'),
+    )
+    for row in totals:
+        row_stats = stats[row['customer_id']]
+        row_stats.order_count = row['order_count']
+        row_stats.total_spent = row['total_spent'] or 0
+        row_stats.last_order_at = row['last_order_at']
+
+    CustomerOrderStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerOrderStats',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='order_stats', serialize=False, to='customers.customer')),
+                ('order_count', models.IntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('last_order_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_customer_order_stats, migrations.RunPython.noop),
+    ]
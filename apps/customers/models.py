@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Coalesce, Greatest
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
@@ -16,6 +18,12 @@ class Customer(models.Model):
     def __str__(self):
         return f"{self.user.get_full_name() or self.user.email}"
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            CustomerOrderStats.objects.get_or_create(customer=self)
+
 
     @receiver(post_save, sender=User)
     def create_customer_profile(sender, instance, created, **kwargs):
@@ -50,4 +58,51 @@ class Customer(models.Model):
             'state': self.state,
             'zip_code': self.zip_code,
             'is_verified': self.is_verified,
-        }
\ No newline at end of file
+        }
+
+
+class CustomerOrderStats(models.Model):
+    """Order count, lifetime spend and last order date for a customer.
+
+    Cancelled orders are not counted or summed; last_order_at is the most
+    recent order placed, whatever its status. Kept in step by the order
+    code with F() updates, and repaired by rebuild_customer_order_stats.
+    """
+    customer = models.OneToOneField(
+        Customer,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='order_stats'
+    )
+    order_count = models.IntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def order_placed(cls, customer_id, amount, order_date, counted=True):
+        """Record a new order; counted is False for an order created already cancelled"""
+        values = {'last_order_at': Greatest(Coalesce(F('last_order_at'), Value(order_date)), Value(order_date))}
+        if counted:
+            values.update(order_count=F('order_count') + 1, total_spent=F('total_spent') + amount)
+        cls.objects.filter(customer_id=customer_id).update(**values)
+
+    @classmethod
+    def add_orders(cls, deltas):
+        """Apply (count, amount) deltas per customer id in one UPDATE"""
+        deltas = {pk: delta for pk, delta in deltas.items() if any(delta)}
+        if not deltas:
+            return
+        cls.objects.filter(customer_id__in=deltas).update(
+            order_count=F('order_count') + Case(
+                *[When(customer_id=pk, then=Value(count)) for pk, (count, _) in deltas.items()],
+                default=Value(0),
+            ),
+            total_spent=F('total_spent') + Case(
+                *[When(customer_id=pk, then=Value(amount)) for pk, (_, amount) in deltas.items()],
+                default=Value(0),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+
+    def __str__(self):
+        return f"{self.customer} order stats"
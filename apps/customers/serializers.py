@@ -4,11 +4,17 @@ from apps.customers.models import Customer
 
 
 class CustomerSerializer(serializers.ModelSerializer):
+    order_count = serializers.IntegerField(source='order_stats.order_count', read_only=True)
+    total_spent = serializers.DecimalField(
+        source='order_stats.total_spent', max_digits=14, decimal_places=2, read_only=True
+    )
+    last_order_at = serializers.DateTimeField(source='order_stats.last_order_at', read_only=True)
+
     class Meta:
         model = Customer
         fields = [
             'id', 'user', 'phone', 'address', 'city',
             'state', 'zip_code',
-            'is_verified'
+            'is_verified', 'order_count', 'total_spent', 'last_order_at'
         ]
         read_only_fields = ['id', 'user']
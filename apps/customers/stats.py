@@ -0,0 +1,68 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+
+from apps.customers.models import Customer, CustomerOrderStats
+from apps.orders.models import Order
+
+STAT_FIELDS = ['order_count', 'total_spent', 'last_order_at']
+
+
+def compute_customer_order_stats():
+    """Recompute every customer's order stats from the order table.
+
+    Returns:
+        dict: Customer id to a dict of STAT_FIELDS values.
+    """
+    stats = {
+        pk: {'order_count': 0, 'total_spent': Decimal('0'), 'last_order_at': None}
+        for pk in Customer.objects.values_list('id', flat=True)
+    }
+    counted = ~Q(status='cancelled')
+    totals = Order.objects.values('customer_id').annotate(
+        order_count=Count('id', filter=counted),
+        total_spent=Sum('total_amount', filter=counted),
+        last_order_at=Max('order_date'),
+    )
+    for row in totals:
+        stats[row['customer_id']] = {
+            'order_count': row['order_count'],
+            'total_spent': row['total_spent'] or Decimal('0'),
+            'last_order_at': row['last_order_at'],
+        }
+    return stats
+
+
+@transaction.atomic
+def rebuild_customer_order_stats(fix=True):
+    """Compare stored customer order stats with freshly computed ones and optionally repair them.
+
+    Args:
+        fix (bool): Write the computed values when they differ.
+
+    Returns:
+        list: Customer ids whose stored stats were missing or wrong.
+    """
+    # Lock the stats first so orders committing meanwhile either land in
+    # the aggregates below or apply their delta after we finish.
+    stored = {row.customer_id: row for row in CustomerOrderStats.objects.select_for_update()}
+    expected = compute_customer_order_stats()
+
+    drifted, missing, changed = [], [], []
+    for pk, values in expected.items():
+        row = stored.get(pk)
+        if row is None:
+            drifted.append(pk)
+            missing.append(CustomerOrderStats(customer_id=pk, **values))
+        elif any(getattr(row, field) != values[field] for field in STAT_FIELDS):
+            drifted.append(pk)
+            for field in STAT_FIELDS:
+                setattr(row, field, values[field])
+            changed.append(row)
+
+    if fix:
+        CustomerOrderStats.objects.bulk_create(missing, batch_size=1000)
+        CustomerOrderStats.objects.bulk_update(changed, STAT_FIELDS, batch_size=1000)
+
+    return drifted
@@ -1,3 +1,80 @@
-from django.test import TestCase
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.customers.models import Customer, CustomerOrderStats
+from apps.orders.models import Order
+from apps.products.models import Category, Product
+
+
+class CustomerOrderStatsTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer", email="buyer@example.com", is_staff=True)
+        self.customer = Customer.objects.get(user=self.user)
+        category = Category.objects.create(name="Stationery")
+        self.product = Product.objects.create(
+            name="Notebook", price=Decimal('4.50'), category=category, sku="STAT001", stock_quantity=50
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def stats(self):
+        return CustomerOrderStats.objects.get(customer=self.customer)
+
+    def place_order(self, quantity):
+        response = self.client.post(reverse('order-list'), {
+            'customer': self.customer.pk, 'items': [{'product': self.product.pk, 'quantity': quantity}]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def test_orders_update_stats(self):
+        first = self.place_order(2)
+        second = self.place_order(1)
+        stats = self.stats()
+        self.assertEqual((stats.order_count, stats.total_spent), (2, Decimal('13.50')))
+        self.assertEqual(stats.last_order_at, Order.objects.get(pk=second).order_date)
+
+        response = self.client.get(reverse('customers:customer'))
+        self.assertEqual(response.data[0]['order_count'], 2)
+        self.assertEqual(response.data[0]['total_spent'], '13.50')
+
+        self.client.patch(reverse('order-update-status', kwargs={'pk': first}), {'status': 'cancelled'}, format='json')
+        self.assertEqual((self.stats().order_count, self.stats().total_spent), (1, Decimal('4.50')))
+
+        self.client.post(reverse('order-bulk-status'), {'order_ids': [second], 'status': 'cancelled'}, format='json')
+        self.assertEqual((self.stats().order_count, self.stats().total_spent), (0, Decimal('0')))
+
+    def test_generic_update_leaves_stats_alone(self):
+        order_id = self.place_order(2)
+        self.client.patch(reverse('order-detail', kwargs={'pk': order_id}), {'status': 'cancelled'}, format='json')
+        self.assertEqual((self.stats().order_count, self.stats().total_spent), (1, Decimal('9.00')))
+        call_command('rebuild_customer_order_stats', '--verify', stdout=StringIO())
+
+    def test_deleted_order_is_subtracted(self):
+        first = Order.objects.create(customer=self.customer, total_amount=Decimal('3.00'))
+        order = Order.objects.create(customer=self.customer, total_amount=Decimal('8.00'))
+        self.assertEqual(self.stats().order_count, 2)
+        order.delete()
+        stats = self.stats()
+        self.assertEqual((stats.order_count, stats.total_spent), (1, Decimal('3.00')))
+        self.assertEqual(stats.last_order_at, first.order_date)
+
+        first.delete()
+        self.assertIsNone(self.stats().last_order_at)
+        call_command('rebuild_customer_order_stats', '--verify', stdout=StringIO())
+
+    def test_rebuild_command_repairs_drift(self):
+        self.place_order(2)
+        CustomerOrderStats.objects.filter(customer=self.customer).update(order_count=5)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_customer_order_stats', '--verify', stdout=StringIO())
+        call_command('rebuild_customer_order_stats', stdout=StringIO())
+        call_command('rebuild_customer_order_stats', '--verify', stdout=StringIO())
+        self.assertEqual((self.stats().order_count, self.stats().total_spent), (1, Decimal('9.00')))
@@ -9,7 +9,7 @@ class CustomerViewSet(viewsets.ModelViewSet):
     pagination_class = None
 
     def get_queryset(self):
-        queryset = Customer.objects.all()
+        queryset = Customer.objects.select_related('order_stats')
         if self.request.user.is_authenticated:
             queryset = queryset.filter(user=self.request.user)
         return queryset
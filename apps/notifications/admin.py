@@ -0,0 +1,9 @@
+from django.contrib import admin
+
+from apps.notifications.models import Notification
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'channel', 'recipient', 'status', 'attempts', 'next_attempt_at')
+    list_filter = ('channel', 'status')
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from utils import send_sms
+from utils.send_sms import LocmemTransport, SMSGateway
+
+
+class Command(BaseCommand):
+    help = "Compare one API call per SMS with the coalescing gateway, using the local fake transport"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=500)
+        parser.add_argument(
+            '--distinct', type=int, default=None,
+            help="Distinct texts among the messages (default: one per message, like per-order status texts)",
+        )
+        parser.add_argument('--latency', type=float, default=0.05, help="Simulated seconds per API call")
+        parser.add_argument('--pool-size', type=int, default=4)
+
+    def handle(self, *args, **options):
+        distinct = options['distinct'] or options['messages']
+        messages = [
+            (f'+2547{number:08d}', f"Order #{number % distinct} status updated: Shipped")
+            for number in range(options['messages'])
+        ]
+
+        transport = LocmemTransport(latency=options['latency'])
+        started = time.perf_counter()
+        for phone_number, message in messages:
+            transport.send(message, [phone_number])
+        self.report("one call per SMS", transport.calls, time.perf_counter() - started)
+
+        transport = LocmemTransport(latency=options['latency'])
+        gateway = SMSGateway(transport, workers=options['pool_size'])
+        started = time.perf_counter()
+        futures = [gateway.submit(phone_number, message) for phone_number, message in messages]
+        for future in futures:
+            future.result()
+        self.report("gateway", transport.calls, time.perf_counter() - started)
+        gateway.close()
+        send_sms.outbox.clear()
+
+    def report(self, name, calls, seconds):
+        self.stdout.write(f"{name:<18}{calls:>6} API calls {seconds * 1000:>9.1f} ms")
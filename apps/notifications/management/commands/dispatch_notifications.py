@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.notifications.outbox import dispatch_due
+
+
+class Command(BaseCommand):
+    help = "Deliver queued SMS and admin email notifications (runs until stopped unless --once)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain what is due now, then exit")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--idle-sleep', type=float, default=1.0, help="Seconds to wait when nothing is due")
+
+    def handle(self, *args, **options):
+        while True:
+            counts = dispatch_due(options['batch_size'])
+            if any(counts.values()):
+                self.stdout.write(f"Sent {counts['sent']}, retrying {counts['retrying']}, failed {counts['failed']}")
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['idle_sleep'])
@@ -0,0 +1,43 @@
+from django.db import models
+
+
+class Notification(models.Model):
+    """An SMS or admin email waiting in the outbox.
+
+    Rows are written in the same transaction as the change they announce,
+    so a notification exists exactly when that change commits. The
+    dispatch_notifications worker delivers them afterwards, retrying with
+    backoff until max attempts, after which the row is left as 'failed'
+    (dead-lettered) for inspection.
+    """
+    CHANNEL_CHOICES = [
+        ('sms', 'SMS'),
+        ('email', 'Admin email'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    # Phone number for SMS; admin emails go to ADMIN_EMAIL
+    recipient = models.CharField(max_length=255, blank=True)
+    subject = models.CharField(max_length=255, blank=True)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Due time for pending rows; a claimed row is leased until this time
+    next_attempt_at = models.DateTimeField()
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker polls pending rows by due time
+            models.Index(fields=['status', 'next_attempt_at'], name='notification_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_channel_display()} to {self.recipient or 'admin'} ({self.status})"
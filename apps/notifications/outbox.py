@@ -0,0 +1,167 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from apps.notifications.models import Notification
+from utils.send_email import send_admin_digest, send_admin_emails
+from utils.send_sms import SEND_TIMEOUT, get_gateway
+
+# Seconds a claimed batch is hidden from other workers; a worker that dies
+# mid-batch has its rows picked up again after this
+LEASE_SECONDS = 300
+MAX_RETRY_DELAY = 3600
+
+
+def enqueue_sms(phone_number, message):
+    """Queue an SMS; call inside the transaction whose commit it announces"""
+    return Notification.objects.create(
+        channel='sms', recipient=phone_number, body=message, next_attempt_at=timezone.now()
+    )
+
+
+def enqueue_sms_many(messages):
+    """Queue (phone number, message) pairs with one INSERT"""
+    now = timezone.now()
+    return Notification.objects.bulk_create([
+        Notification(channel='sms', recipient=phone_number, body=message, next_attempt_at=now)
+        for phone_number, message in messages
+    ])
+
+
+def enqueue_admin_email(subject, body):
+    """Queue an email to ADMIN_EMAIL; call inside the transaction whose commit it announces"""
+    return Notification.objects.create(
+        channel='email', subject=subject, body=body, next_attempt_at=timezone.now()
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff from NOTIFICATION_RETRY_SECONDS, capped at an hour"""
+    return min(settings.NOTIFICATION_RETRY_SECONDS * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def claim_due(batch_size, now=None, channels=('sms', 'email')):
+    """Lease up to batch_size due notifications to this worker.
+
+    Rows locked by another worker are skipped (SKIP LOCKED on PostgreSQL),
+    and each claim counts as an attempt.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(channel__in=channels, status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at').values_list('pk', flat=True)[:batch_size]
+        )
+        Notification.objects.filter(pk__in=ids).update(
+            attempts=F('attempts') + 1, next_attempt_at=now + timedelta(seconds=LEASE_SECONDS)
+        )
+    return list(Notification.objects.filter(pk__in=ids).order_by('pk'))
+
+
+def claim_digest(now=None):
+    """Lease the due admin emails once a digest is ready to go.
+
+    A digest is ready when the oldest due email has waited
+    ADMIN_EMAIL_DIGEST_SECONDS or ADMIN_EMAIL_DIGEST_SIZE emails are due.
+    """
+    now = now or timezone.now()
+    due = Notification.objects.filter(channel='email', status='pending', next_attempt_at__lte=now).aggregate(
+        count=Count('pk'), oldest=Min('created_at')
+    )
+    size = settings.ADMIN_EMAIL_DIGEST_SIZE
+    if not due['count']:
+        return []
+    if due['count'] < size and due['oldest'] > now - timedelta(seconds=settings.ADMIN_EMAIL_DIGEST_SECONDS):
+        return []
+    return claim_due(size, now, channels=('email',))
+
+
+def _error(exception):
+    return None if exception is None else f"{type(exception).__name__}: {exception}"
+
+
+def _sms_error(future):
+    try:
+        future.result(SEND_TIMEOUT)
+    except Exception as e:
+        return _error(e)
+    return None
+
+
+def send_batch(notifications):
+    """Send notifications; returns an error message or None for each.
+
+    All SMS are handed to the gateway at once so identical texts go out in
+    one API call, and all emails share one SMTP connection.
+    """
+    gateway = get_gateway()
+    sms = {
+        notification.pk: gateway.submit(notification.recipient, notification.body)
+        for notification in notifications if notification.channel == 'sms'
+    }
+    # Settle every SMS before any email I/O, so an SMTP failure cannot
+    # hide SMS that already went out
+    errors = {pk: _sms_error(future) for pk, future in sms.items()}
+
+    emails = [notification for notification in notifications if notification.channel == 'email']
+    if emails:
+        exceptions = send_admin_emails([(email.subject, email.body) for email in emails])
+        errors.update((email.pk, _error(exception)) for email, exception in zip(emails, exceptions))
+    return [errors[notification.pk] for notification in notifications]
+
+
+def send_digest(emails):
+    """Send admin emails as one digest; the outcome applies to all of them"""
+    if not emails:
+        return []
+    try:
+        send_admin_digest([(email.subject, email.body) for email in emails])
+    except Exception as e:
+        return [_error(e)] * len(emails)
+    return [None] * len(emails)
+
+
+def dispatch_due(batch_size=100):
+    """Deliver one batch of due notifications and record the outcomes.
+
+    With ADMIN_EMAIL_DIGEST_SECONDS set, admin emails are held back and
+    sent as one digest by claim_digest() rules instead. The database is
+    only touched from the calling thread.
+
+    Returns:
+        dict: Counts of 'sent', 'retrying' and 'failed' notifications.
+    """
+    counts = {'sent': 0, 'retrying': 0, 'failed': 0}
+    if settings.ADMIN_EMAIL_DIGEST_SECONDS:
+        notifications = claim_due(batch_size, channels=('sms',))
+        digest = claim_digest()
+    else:
+        notifications = claim_due(batch_size)
+        digest = []
+    if not notifications and not digest:
+        return counts
+
+    errors = send_batch(notifications) + send_digest(digest)
+    notifications += digest
+
+    now = timezone.now()
+    sent = [notification.pk for notification, error in zip(notifications, errors) if error is None]
+    Notification.objects.filter(pk__in=sent).update(status='sent', sent_at=now, last_error='')
+    counts['sent'] = len(sent)
+    for notification, error in zip(notifications, errors):
+        if error is None:
+            continue
+        if notification.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+            # Dead-lettered; left for inspection and manual requeue
+            Notification.objects.filter(pk=notification.pk).update(status='failed', last_error=error)
+            counts['failed'] += 1
+        else:
+            Notification.objects.filter(pk=notification.pk).update(
+                next_attempt_at=now + timedelta(seconds=retry_delay(notification.attempts)), last_error=error
+            )
+            counts['retrying'] += 1
+    return counts
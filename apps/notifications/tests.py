@@ -0,0 +1,147 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from apps.notifications.models import Notification
+from apps.notifications.outbox import dispatch_due, enqueue_admin_email, enqueue_sms
+from utils import send_sms
+from utils.send_sms import LocmemTransport, SMSError, SMSGateway
+
+
+@override_settings(SMS_TRANSPORT='utils.send_sms.LocmemTransport', NOTIFICATION_MAX_ATTEMPTS=2)
+class OutboxDispatchTest(TestCase):
+    def setUp(self):
+        send_sms.outbox.clear()
+
+    def test_dispatch_sends_and_marks_sent(self):
+        enqueue_sms('+254700000001', "Shipped")
+        enqueue_admin_email("New Order #1", "Body")
+
+        self.assertEqual(dispatch_due(), {'sent': 2, 'retrying': 0, 'failed': 0})
+        self.assertEqual(send_sms.outbox, [('+254700000001', "Shipped")])
+        self.assertEqual(mail.outbox[0].subject, "New Order #1")
+        self.assertFalse(Notification.objects.exclude(status='sent').exists())
+        self.assertEqual(dispatch_due(), {'sent': 0, 'retrying': 0, 'failed': 0})
+
+    def test_failures_back_off_then_dead_letter(self):
+        notification = enqueue_sms('+254700000001', "Shipped")
+        with patch.object(LocmemTransport, 'send', side_effect=ConnectionError("gateway down")):
+            self.assertEqual(dispatch_due(), {'sent': 0, 'retrying': 1, 'failed': 0})
+            notification.refresh_from_db()
+            self.assertEqual(notification.status, 'pending')
+            self.assertGreater(notification.next_attempt_at, timezone.now() + timedelta(seconds=20))
+            self.assertIn("gateway down", notification.last_error)
+
+            # Not due yet
+            self.assertEqual(dispatch_due(), {'sent': 0, 'retrying': 0, 'failed': 0})
+            Notification.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(dispatch_due(), {'sent': 0, 'retrying': 0, 'failed': 1})
+
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), ('failed', 2))
+        self.assertEqual(send_sms.outbox, [])
+
+    def test_command_drains_outbox(self):
+        for number in range(3):
+            enqueue_sms(f'+25470000000{number}', "Hi")
+        out = StringIO()
+        call_command('dispatch_notifications', '--once', '--batch-size', '2', stdout=out)
+        self.assertEqual(len(send_sms.outbox), 3)
+        self.assertIn("Sent 2", out.getvalue())
+        self.assertIn("Sent 1", out.getvalue())
+
+
+class SMSGatewayTest(SimpleTestCase):
+    def setUp(self):
+        send_sms.outbox.clear()
+        self.transport = LocmemTransport()
+        self.gateway = SMSGateway(self.transport, coalesce_seconds=0.05)
+        self.addCleanup(self.gateway.close)
+
+    def test_identical_texts_share_one_call(self):
+        futures = [self.gateway.submit(f'+25470000000{number}', "Order shipped") for number in range(5)]
+        futures.append(self.gateway.submit('+254700000009', "Order delivered"))
+        results = [future.result(5) for future in futures]
+
+        self.assertEqual(self.transport.calls, 2)
+        self.assertEqual([result['number'] for result in results[:5]], [f'+25470000000{n}' for n in range(5)])
+        self.assertEqual(len(send_sms.outbox), 6)
+
+    def test_per_recipient_failures_map_back(self):
+        def send(message, recipients):
+            return [
+                {'number': recipients[0], 'status': 'Success'},
+                {'number': recipients[1], 'status': 'InvalidPhoneNumber'},
+            ]
+
+        with patch.object(self.transport, 'send', side_effect=send):
+            ok = self.gateway.submit('+254700000001', "Hi")
+            bad = self.gateway.submit('+254700000002', "Hi")
+            self.assertEqual(ok.result(5)['status'], 'Success')
+            with self.assertRaisesMessage(SMSError, 'InvalidPhoneNumber'):
+                bad.result(5)
+
+    def test_results_match_on_normalized_numbers(self):
+        def send(message, recipients):
+            return [{'number': '+254712345678', 'status': 'Success'}]
+
+        with patch.object(self.transport, 'send', side_effect=send):
+            local = self.gateway.submit('0712 345-678', "Hi")
+            missing = self.gateway.submit('+254700000002', "Hi")
+            self.assertEqual(local.result(5)['status'], 'Success')
+            self.assertEqual(missing.result(5)['status'], 'Unknown')
+
+    def test_large_groups_are_split(self):
+        self.transport.max_recipients = 2
+        futures = [self.gateway.submit(f'+25470000000{number}', "Sale") for number in range(5)]
+        for future in futures:
+            future.result(5)
+        self.assertEqual(self.transport.calls, 3)
+
+
+@override_settings(SMS_TRANSPORT='utils.send_sms.LocmemTransport')
+class AdminEmailDeliveryTest(TestCase):
+    def test_per_order_emails_share_one_connection(self):
+        for number in range(3):
+            enqueue_admin_email(f"New Order #{number}", "Body")
+        with patch('utils.send_email.get_connection', wraps=get_connection) as connection:
+            self.assertEqual(dispatch_due()['sent'], 3)
+        connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+
+    @override_settings(ADMIN_EMAIL_DIGEST_SECONDS=600, ADMIN_EMAIL_DIGEST_SIZE=3)
+    def test_digest_waits_for_window_or_size(self):
+        enqueue_admin_email("New Order #1", "First")
+        enqueue_admin_email("New Order #2", "Second")
+        self.assertEqual(dispatch_due()['sent'], 0)
+
+        Notification.objects.update(created_at=timezone.now() - timedelta(minutes=11))
+        self.assertEqual(dispatch_due()['sent'], 2)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "Order digest: 2 notification(s)")
+        self.assertIn("New Order #2", mail.outbox[0].body)
+
+        for number in range(3, 6):
+            enqueue_admin_email(f"New Order #{number}", "Body")
+        self.assertEqual(dispatch_due()['sent'], 3)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_smtp_connection_failure_fails_emails_only(self):
+        send_sms.outbox.clear()
+        sms = enqueue_sms('+254700000001', "Shipped")
+        email = enqueue_admin_email("New Order #1", "Body")
+        with patch('django.core.mail.backends.locmem.EmailBackend.open', side_effect=OSError("connection refused")):
+            self.assertEqual(dispatch_due(), {'sent': 1, 'retrying': 1, 'failed': 0})
+
+        sms.refresh_from_db()
+        email.refresh_from_db()
+        self.assertEqual(sms.status, 'sent')
+        self.assertEqual(send_sms.outbox, [('+254700000001', "Shipped")])
+        self.assertEqual(email.status, 'pending')
+        self.assertIn("connection refused", email.last_error)
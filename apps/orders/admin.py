@@ -6,3 +6,10 @@ from apps.orders.models import Order, OrderItem
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'customer', 'total_amount')
     search_fields = ('id', 'customer__email')
+    readonly_fields = ('status', 'version')
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # Like the API: leave status and version to the transition endpoints
+        obj.save(update_fields=[*form.changed_data, 'updated_at'])
@@ -0,0 +1,149 @@
+import hashlib
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from apps.orders.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+# Seconds an in-flight claim blocks the key before another request may take it over
+IN_FLIGHT_SECONDS = 60
+POLL_INTERVAL = 0.1
+
+
+def _digest(*parts):
+    return hashlib.sha256('\n'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def claim_key(key, fingerprint):
+    """Insert an in-flight row for key, taking over an expired one.
+
+    Returns:
+        tuple: (row, claimed). The row is the existing one when claimed is
+        False, or None if it vanished in between.
+    """
+    now = timezone.now()
+    IdempotencyKey.objects.filter(key=key, expires_at__lte=now).delete()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                key=key, fingerprint=fingerprint, expires_at=now + timedelta(seconds=IN_FLIGHT_SECONDS)
+            )
+        return record, True
+    except IntegrityError:
+        return IdempotencyKey.objects.filter(key=key).first(), False
+
+
+def store_response(record, response):
+    """Store the response under the claim; returns False if another request took the key over"""
+    return bool(IdempotencyKey.objects.filter(key=record.key, token=record.token).update(
+        response_status=response.status_code,
+        response_body=response.data,
+        expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS),
+    ))
+
+
+def release_key(record):
+    """Delete the claim, unless another request has since taken the key over"""
+    IdempotencyKey.objects.filter(key=record.key, token=record.token).delete()
+
+
+def purge_expired_keys(now=None, batch_size=1000):
+    """Delete stored keys past their expiry.
+
+    Returns:
+        int: Number of keys deleted.
+    """
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        expired = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:batch_size])
+        if not expired:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=expired).delete()[0]
+
+
+def idempotent(view_method):
+    """Make a view action safe to retry with an Idempotency-Key header.
+
+    The first request with a key runs the action and stores its response;
+    retries get the stored response back with an Idempotent-Replayed header.
+    A duplicate arriving while the first is still running waits for it (up
+    to IDEMPOTENCY_WAIT_SECONDS, then 409). Returned responses below 500,
+    client errors included, are stored and replayed. Raised exceptions
+    (validation errors, 404s, crashes) and returned 5xx responses roll the
+    action back and release the key, so the request can be retried. Keys
+    are scoped to the user and path, and reusing one with a different body
+    is rejected with 422.
+
+    The key row is claimed outside any transaction the action opens, so
+    concurrent duplicates see it straight away. The response is stored in
+    the same transaction as the action, so a crash cannot commit one
+    without the other, and only under the claim's token: a request still
+    running when a duplicate took over its expired claim rolls back with
+    409 instead of committing a second time.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        value = request.headers.get(IDEMPOTENCY_HEADER)
+        if value is None:
+            return view_method(self, request, *args, **kwargs)
+        if not value or len(value) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        key = _digest(request.user.pk, request.method, request.path, value)
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            record, claimed = claim_key(key, fingerprint)
+            if claimed:
+                break
+            if record is not None:
+                if record.fingerprint != fingerprint:
+                    return Response(
+                        {'error': f'{IDEMPOTENCY_HEADER} was already used with a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                if record.response_status is not None:
+                    return Response(
+                        record.response_body, status=record.response_status, headers={REPLAYED_HEADER: 'true'}
+                    )
+            if time.monotonic() >= deadline:
+                return Response(
+                    {'error': 'A request with this Idempotency-Key is still being processed'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            time.sleep(POLL_INTERVAL)
+
+        try:
+            with transaction.atomic():
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code < 500:
+                    if store_response(record, response):
+                        return response
+                    # The claim expired and a duplicate now owns the key; it
+                    # runs the action itself, so this run must not commit
+                    transaction.set_rollback(True)
+                    return Response(
+                        {'error': 'A request with this Idempotency-Key was taken over by a retry'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                transaction.set_rollback(True)
+        except Exception:
+            release_key(record)
+            raise
+        release_key(record)
+        return response
+
+    return wrapper
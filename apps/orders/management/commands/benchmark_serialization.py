@@ -0,0 +1,78 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.orders.models import Order, OrderItem
+from apps.orders.serializers import OrderSerializer
+from apps.products.models import Category, Product
+from apps.products.serializers import ProductSerializer
+from utils.benchmarking import percentile, time_calls
+
+
+class Command(BaseCommand):
+    help = "Compare model serializers with the values() fast path on list pages (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5000, help="Number of products to generate")
+        parser.add_argument('--orders', type=int, default=2000, help="Number of orders to generate")
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per path")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._generate(options['products'], options['orders'])
+            size = options['page_size']
+
+            products = Product.objects.with_available_stock().order_by('id')
+            orders = Order.objects.select_related('customer__user').prefetch_related('items__product').order_by('-id')
+            cases = [
+                ('products', 'serializer',
+                 lambda: ProductSerializer(list(products[:size]), many=True).data),
+                ('products', 'values',
+                 lambda: self._fast(ProductSerializer(), products, size, 'category_id')),
+                ('orders', 'serializer',
+                 lambda: OrderSerializer(list(orders[:size]), many=True).data),
+                ('orders', 'values',
+                 lambda: self._fast(OrderSerializer(), Order.objects.order_by('-id'), size)),
+            ]
+
+            self.stdout.write(f"{'endpoint':<12}{'path':<12}{'p50 ms':>10}{'p95 ms':>10}")
+            for endpoint, label, run in cases:
+                timings, _ = time_calls(run, options['repeat'])
+                self.stdout.write(
+                    f"{endpoint:<12}{label:<12}{statistics.median(timings):>10.2f}"
+                    f"{percentile(timings, 95):>10.2f}"
+                )
+
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _fast(serializer, queryset, size, *lookups):
+        return serializer.represent_rows(serializer.values_queryset(queryset, 'id', *lookups)[:size])
+
+    def _generate(self, product_count, order_count):
+        self.stdout.write(f"Generating {product_count} products and {order_count} orders...")
+        root = Category.objects.create(name="Serialization benchmark", slug=f"serialization-benchmark-{time.time()}")
+        leaf = Category.objects.create(name="Leaf", parent=root, slug=f"serialization-benchmark-leaf-{time.time()}")
+        Product.objects.bulk_create([
+            Product(
+                name=f"Benchmark product {i}", description="Lorem ipsum " * 10, price='19.99',
+                category=leaf if i % 2 else root, sku=f"SER-{i:06}", stock_quantity=100,
+            )
+            for i in range(product_count)
+        ], batch_size=5000)
+        product_ids = list(Product.objects.filter(sku__startswith='SER-').values_list('id', flat=True)[:50])
+
+        user = User.objects.create_user(username=f"benchmark-{time.time()}", first_name="Bench", last_name="Mark")
+        orders = Order.objects.bulk_create([
+            Order(customer=user.customer, total_amount=Decimal('59.97')) for _ in range(order_count)
+        ], batch_size=5000)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product_ids[(order.pk + n) % len(product_ids)], quantity=3,
+                      unit_price=Decimal('19.99'), total_price=Decimal('59.97'))
+            for order in orders for n in range(3)
+        ], batch_size=5000)
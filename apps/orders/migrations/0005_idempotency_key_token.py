@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:45
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_version_status_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='token',
+            field=models.UUIDField(default=uuid.uuid4),
+        ),
+    ]
@@ -1,9 +1,17 @@
+import uuid
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 from django.db import models
 
 from apps.customers.models import Customer
 from apps.products.models import Product
 
+# Cache version namespaces for order and customer changes
+ORDERS_VERSION = 'orders'
+CUSTOMERS_VERSION = 'customers'
+
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -13,6 +21,16 @@ class Order(models.Model):
         ('delivered', 'Delivered'),
         ('cancelled', 'Cancelled'),
     ]
+    # Status -> statuses an order may move to from it
+    ALLOWED_TRANSITIONS = {
+        'pending': {'confirmed', 'shipped', 'cancelled'},
+        'confirmed': {'shipped', 'cancelled'},
+        'shipped': {'delivered'},
+        'delivered': set(),
+        'cancelled': set(),
+    }
+    # Statuses the customer is told about by SMS
+    NOTIFY_STATUSES = ('shipped', 'delivered')
 
     customer = models.ForeignKey(
         Customer,
@@ -24,10 +42,51 @@ class Order(models.Model):
     order_date = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     notes = models.TextField(blank=True)
+    # Incremented by every status change; status updates compare-and-swap on it
+    version = models.PositiveIntegerField(default=1)
 
     def __str__(self):
         return f"Order #{self.id} - {self.customer}"
 
+    @staticmethod
+    def status_message(order_id, status):
+        """SMS text telling a customer their order moved to status"""
+        return f"Order #{order_id} status updated: {status.title()}"
+
+
+class OrderStatusTransition(models.Model):
+    """Append-only log of order status changes, one row per order version"""
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='status_history'
+    )
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    # The order's version after this change
+    version = models.PositiveIntegerField()
+    changed_at = models.DateTimeField(auto_now_add=True)
+    changed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'version'], name='order_status_transition_version_uniq'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Order status transitions are append-only")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Order #{self.order_id} v{self.version}: {self.from_status} -> {self.to_status}"
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(
@@ -51,3 +110,88 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.quantity}x {self.product.name}"
+
+
+class Reservation(models.Model):
+    """Stock held for a checkout in progress.
+
+    The held quantities are taken off Product.stock_quantity when the
+    reservation is created, so that column is always the available-to-sell
+    count. Stock goes back on the shelf if the reservation is released or
+    expires before an order commits it.
+    """
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('committed', 'Committed'),
+        ('released', 'Released'),
+        ('expired', 'Expired'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    customer = models.ForeignKey(
+        Customer,
+        on_delete=models.CASCADE,
+        related_name='reservations'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    order = models.OneToOneField(
+        Order,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reservation'
+    )
+
+    class Meta:
+        indexes = [
+            # The reaper scans active reservations by expiry
+            models.Index(fields=['status', 'expires_at'], name='reservation_status_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"Reservation {self.id} ({self.status})"
+
+
+class ReservationItem(models.Model):
+    reservation = models.ForeignKey(
+        Reservation,
+        on_delete=models.CASCADE,
+        related_name='items'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE
+    )
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+
+    def __str__(self):
+        return f"{self.quantity}x {self.product_id}"
+
+
+class IdempotencyKey(models.Model):
+    """Outcome of a request sent with an Idempotency-Key header.
+
+    The key is a SHA-256 of the user, method, path and header value, so rows
+    are fixed width whatever clients send. A row without a response is a
+    request still in flight; expires_at is short while in flight and is
+    pushed out to the retention window once the response is stored.
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    # SHA-256 of the request body, to reject a key reused for another payload
+    fingerprint = models.CharField(max_length=64)
+    # Identifies the claim, so a request whose claim was taken over cannot store
+    token = models.UUIDField(default=uuid.uuid4)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(encoder=DjangoJSONEncoder, null=True, blank=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Purged by expiry
+            models.Index(fields=['expires_at'], name='idempotency_key_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key[:12]} ({self.response_status or 'in flight'})"
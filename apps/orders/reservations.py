@@ -0,0 +1,106 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.orders.models import Reservation, ReservationItem
+from apps.products.models import Product
+
+
+class InsufficientStock(Exception):
+    """Raised when a hold cannot be served; shortfall maps product id to available stock"""
+
+    def __init__(self, shortfall):
+        super().__init__(shortfall)
+        self.shortfall = shortfall
+
+
+def line_quantities(lines):
+    """Sum (product id, quantity) pairs per product"""
+    quantities = defaultdict(int)
+    for product_id, quantity in lines:
+        quantities[product_id] += quantity
+    return quantities
+
+
+def create_reservation(customer, lines, ttl=None):
+    """Hold stock for a checkout.
+
+    The stock is taken with the same single conditional UPDATE as order
+    creation, in a short transaction of its own, so row locks are released
+    as soon as the hold exists.
+
+    Args:
+        customer (Customer): Who the hold is for.
+        lines (list): (product id, quantity) pairs.
+        ttl (int): Seconds until the hold expires; RESERVATION_TTL_SECONDS by default.
+
+    Returns:
+        Reservation: The active reservation.
+
+    Raises:
+        InsufficientStock: If any product lacks stock; nothing is held.
+    """
+    ttl = settings.RESERVATION_TTL_SECONDS if ttl is None else ttl
+    with transaction.atomic():
+        shortfall = Product.decrement_stock(line_quantities(lines))
+        if shortfall:
+            raise InsufficientStock(shortfall)
+        reservation = Reservation.objects.create(
+            customer=customer, expires_at=timezone.now() + timedelta(seconds=ttl)
+        )
+        ReservationItem.objects.bulk_create([
+            ReservationItem(reservation=reservation, product_id=product_id, quantity=quantity)
+            for product_id, quantity in lines
+        ])
+    return reservation
+
+
+def release_reservation(reservation_id, status='released'):
+    """Put a reservation's stock back on the shelf.
+
+    The active -> released/expired transition is a conditional UPDATE, so a
+    reservation is returned at most once even if the reaper and the client
+    race.
+
+    Returns:
+        bool: Whether this call released it.
+    """
+    with transaction.atomic():
+        released = Reservation.objects.filter(pk=reservation_id, status='active').update(status=status)
+        if not released:
+            return False
+        lines = ReservationItem.objects.filter(reservation_id=reservation_id).values_list('product_id', 'quantity')
+        Product.increment_stock(line_quantities(lines))
+    return True
+
+
+def commit_reservation(reservation_id, order):
+    """Mark an unexpired active reservation as used by an order.
+
+    Returns:
+        bool: False if it expired, was released or was already committed.
+    """
+    return bool(Reservation.objects.filter(
+        pk=reservation_id, status='active', expires_at__gt=timezone.now()
+    ).update(status='committed', order=order))
+
+
+def release_expired_reservations(now=None, batch_size=500):
+    """Return the stock of every active reservation past its expiry.
+
+    Returns:
+        int: Number of reservations released.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        expired = list(
+            Reservation.objects.filter(status='active', expires_at__lte=now)
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not expired:
+            return released
+        released += sum(release_reservation(pk, status='expired') for pk in expired)
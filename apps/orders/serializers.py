@@ -1,10 +1,14 @@
 from rest_framework import serializers
 
-from apps.orders.models import Order, OrderItem
+from apps.customers.serializers import CustomerSerializer
+from apps.orders.models import Order, OrderItem, OrderStatusTransition, Reservation, ReservationItem
+from apps.orders.reservations import InsufficientStock, commit_reservation, create_reservation, line_quantities
 from apps.products.models import Product
+from utils.fast_serialization import ValuesSerializerMixin
+from utils.fieldsets import SparseFieldsetMixin
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(ValuesSerializerMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
 
     class Meta:
@@ -13,55 +17,214 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['total_price', 'unit_price']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsetMixin, ValuesSerializerMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     customer_name = serializers.CharField(source='customer.__str__', read_only=True)
 
+    expandable_fields = {
+        'customer': (CustomerSerializer, {'read_only': True}),
+    }
+    field_requirements = {
+        'customer_name': {'only': ['customer'], 'select_related': ['customer__user']},
+        'items': {'prefetch_related': ['items__product']},
+    }
+    expanded_requirements = {
+        'customer': {'only': ['customer'], 'select_related': ['customer__order_stats']},
+    }
+    values_fields = {
+        'customer_name': (
+            ['customer__user__first_name', 'customer__user__last_name', 'customer__user__email'],
+            'customer_name_from_row'
+        ),
+        'items': (['id'], 'items_from_row'),
+    }
+
     class Meta:
         model = Order
         fields = [
             'id', 'customer', 'customer_name', 'status',
-            'total_amount', 'order_date', 'notes', 'items'
+            'total_amount', 'order_date', 'notes', 'items', 'version'
         ]
-        read_only_fields = ['total_amount']
+        # Status only changes through update_status/bulk_status, which enforce
+        # the transition graph and the version check
+        read_only_fields = ['status', 'total_amount', 'version']
+
+    def update(self, instance, validated_data):
+        # Write only the edited columns; a full save would put back the status
+        # and version get_object() read over a concurrent transition
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
+    def customer_name_from_row(self, row):
+        # Same as Customer.__str__
+        full_name = f"{row['customer__user__first_name']} {row['customer__user__last_name']}".strip()
+        return full_name or row['customer__user__email']
+
+    def prepare_values_rows(self, rows):
+        if 'items' not in self.fields:
+            return
+        item_serializer = self.fields['items'].child
+        items = OrderItem.objects.filter(order_id__in=[row['id'] for row in rows]).order_by('id')
+        self._items_by_order = {}
+        item_rows = list(item_serializer.values_queryset(items, 'order_id'))
+        for row, data in zip(item_rows, item_serializer.represent_rows(item_rows)):
+            self._items_by_order.setdefault(row['order_id'], []).append(data)
+
+    def items_from_row(self, row):
+        return self._items_by_order.get(row['id'], [])
+
+
+class OrderItemCreateSerializer(serializers.Serializer):
+    """Order line as submitted; products are resolved for the whole order at once"""
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+def resolve_line_products(items_data):
+    """Swap product ids for active products loaded in one query, with per-line errors"""
+    if not items_data:
+        raise serializers.ValidationError("Order must contain at least one item")
+
+    products = Product.objects.in_bulk({item_data['product'] for item_data in items_data})
+    errors = []
+    for item_data in items_data:
+        product = products.get(item_data['product'])
+        if product is None:
+            errors.append({'product': [f'Invalid pk "{item_data["product"]}" - object does not exist.']})
+        else:
+            errors.append({})
+            item_data['product'] = product
+    if any(errors):
+        raise serializers.ValidationError(errors)
+
+    for item_data in items_data:
+        product = item_data['product']
+        if not product.is_active:
+            raise serializers.ValidationError(f"Product {product.name} is not available")
+
+    return items_data
+
+
+def product_lines(items_data):
+    """(product id, quantity) pairs for resolved order lines"""
+    return [(item_data['product'].pk, item_data['quantity']) for item_data in items_data]
+
+
+def shortfall_error(items_data, shortfall):
+    """Per-line insufficient stock errors for a product id -> available stock map"""
+    return serializers.ValidationError({'items': [
+        {'quantity': [
+            f"Insufficient stock for {item_data['product'].name}. "
+            f"Available: {shortfall[item_data['product'].pk]}"
+        ]} if item_data['product'].pk in shortfall else {}
+        for item_data in items_data
+    ]})
 
 
 class OrderCreateSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(many=True, write_only=True)
+    items = OrderItemCreateSerializer(many=True, write_only=True, required=False)
+    reservation = serializers.PrimaryKeyRelatedField(
+        queryset=Reservation.objects.prefetch_related('items__product'), required=False, write_only=True
+    )
 
     class Meta:
         model = Order
-        fields = ['customer', 'notes', 'items']
+        fields = ['customer', 'notes', 'items', 'reservation']
+
+    def validate(self, attrs):
+        reservation = attrs.get('reservation')
+        if reservation is None:
+            if 'items' not in attrs:
+                raise serializers.ValidationError({'items': ["This field is required."]})
+            return attrs
+
+        if 'items' in attrs:
+            raise serializers.ValidationError("Send either items or a reservation, not both")
+        if reservation.customer_id != attrs['customer'].pk:
+            raise serializers.ValidationError({'reservation': ["This reservation belongs to another customer."]})
+        attrs['items'] = [
+            {'product': item.product, 'quantity': item.quantity} for item in reservation.items.all()
+        ]
+        return attrs
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-
-        total_amount = sum(
-            item_data['quantity'] * Product.objects.get(id=item_data['product'].id).price
+        reservation = validated_data.pop('reservation', None)
+
+        if reservation is None:
+            self.take_stock(items_data)
+
+        lines = [
+            OrderItem(
+                product=item_data['product'],
+                quantity=item_data['quantity'],
+                unit_price=item_data['product'].price,
+                total_price=item_data['product'].price * item_data['quantity'],
+            )
             for item_data in items_data
-        )
-
-        order = Order.objects.create(total_amount=total_amount, **validated_data)
+        ]
+        order = Order.objects.create(total_amount=sum(line.total_price for line in lines), **validated_data)
+        for line in lines:
+            line.order = order
+        OrderItem.objects.bulk_create(lines)
 
-        for item_data in items_data:
-            OrderItem.objects.create(order=order, **item_data)
+        # The held stock becomes the order's; a stale hold fails the whole order
+        if reservation is not None and not commit_reservation(reservation.pk, order):
+            raise serializers.ValidationError({'reservation': ["This reservation has expired or was already used."]})
 
         return order
 
     def validate_items(self, items_data):
-        if not items_data:
-            raise serializers.ValidationError("Order must contain at least one item")
+        return resolve_line_products(items_data)
+
+    def take_stock(self, items_data):
+        """Decrement stock for every line in one conditional update, reporting shortfalls per line"""
+        shortfall = Product.decrement_stock(line_quantities(product_lines(items_data)))
+        if shortfall:
+            raise shortfall_error(items_data, shortfall)
+
+
+class OrderStatusTransitionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderStatusTransition
+        fields = ['from_status', 'to_status', 'version', 'changed_at', 'changed_by']
+
+
+class OrderBulkStatusSerializer(serializers.Serializer):
+    order_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
 
-        for item_data in items_data:
-            product = item_data['product']
-            quantity = item_data['quantity']
 
-            if not product.is_active:
-                raise serializers.ValidationError(f"Product {product.name} is not available")
+class ReservationItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReservationItem
+        fields = ['product', 'quantity']
+
+
+class ReservationSerializer(serializers.ModelSerializer):
+    items = ReservationItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Reservation
+        fields = ['id', 'customer', 'status', 'expires_at', 'created_at', 'order', 'items']
+        read_only_fields = fields
+
 
-            if product.stock_quantity < quantity:
-                raise serializers.ValidationError(
-                    f"Insufficient stock for {product.name}. Available: {product.stock_quantity}"
-                )
+class ReservationCreateSerializer(serializers.ModelSerializer):
+    items = OrderItemCreateSerializer(many=True, write_only=True)
 
-        return items_data
\ No newline at end of file
+    class Meta:
+        model = Reservation
+        fields = ['customer', 'items']
+
+    def validate_items(self, items_data):
+        return resolve_line_products(items_data)
+
+    def create(self, validated_data):
+        items_data = validated_data['items']
+        try:
+            return create_reservation(validated_data['customer'], product_lines(items_data))
+        except InsufficientStock as e:
+            raise shortfall_error(items_data, e.shortfall)
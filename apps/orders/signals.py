@@ -0,0 +1,56 @@
+from django.db.models import Max, Subquery
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.customers.models import Customer, CustomerOrderStats
+from apps.orders.models import CUSTOMERS_VERSION, ORDERS_VERSION, Order, OrderItem
+from utils.cache_versions import bump_version_on_commit
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def order_changed(sender, instance, **kwargs):
+    """
+    Invalidate order collection validators
+    """
+    bump_version_on_commit(ORDERS_VERSION)
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, **kwargs):
+    """
+    Count a new order in its customer's stats
+    """
+    if created:
+        CustomerOrderStats.order_placed(
+            instance.customer_id, instance.total_amount, instance.order_date,
+            counted=instance.status != 'cancelled'
+        )
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    """
+    Take a deleted order out of its customer's stats
+    """
+    if instance.status != 'cancelled':
+        CustomerOrderStats.add_orders({instance.customer_id: (-1, -instance.total_amount)})
+    # If it was the latest order, last_order_at falls back to the one before
+    latest = (
+        Order.objects.filter(customer_id=instance.customer_id).order_by()
+        .values('customer_id').annotate(latest=Max('order_date')).values('latest')
+    )
+    CustomerOrderStats.objects.filter(
+        customer_id=instance.customer_id, last_order_at__lte=instance.order_date
+    ).update(last_order_at=Subquery(latest))
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def customer_changed(sender, instance, **kwargs):
+    """
+    Orders embed the customer's name, so their validators depend on customers too
+    """
+    bump_version_on_commit(CUSTOMERS_VERSION)
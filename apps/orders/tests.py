@@ -1,13 +1,30 @@
+import json
+import threading
+import time
+import uuid
+from datetime import timedelta
 from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
 
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 
 from apps.customers.models import Customer
-from apps.orders.models import Order, OrderItem
+from apps.notifications.models import Notification
+from apps.orders.idempotency import purge_expired_keys
+from apps.orders.models import IdempotencyKey, Order, OrderItem, OrderStatusTransition, Reservation
+from apps.orders.serializers import OrderSerializer
+from apps.orders.transitions import transition_order
 from apps.products.models import Product, Category
 
 
@@ -108,6 +125,50 @@ class OrderAPITest(APITestCase):
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_insufficient_stock_reported_per_line(self):
+        other = Product.objects.create(
+            name="Other Product", price=Decimal('1.00'), category=self.category, sku="TEST002", stock_quantity=1
+        )
+        data = {
+            'customer': self.customer.pk,
+            'items': [{'product': self.product.pk, 'quantity': 5}, {'product': other.pk, 'quantity': 2}],
+        }
+
+        response = self.client.post(reverse('order-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['items'][0], {})
+        self.assertIn("Available: 1", str(response.data['items'][1]['quantity']))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 100)
+
+    def test_create_order_query_count_is_constant(self):
+        products = [
+            Product.objects.create(
+                name=f"Bulk {n}", price=Decimal('2.50'), category=self.category, sku=f"BULK{n:03}", stock_quantity=10
+            )
+            for n in range(20)
+        ]
+
+        def create(lines):
+            data = {'customer': self.customer.pk, 'items': [{'product': p.pk, 'quantity': 2} for p in lines]}
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(reverse('order-list'), data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return response, len(queries)
+
+        _, single = create(products[:1])
+        response, many = create(products[1:])
+        self.assertEqual(many, single)
+        self.assertEqual(Decimal(response.data['total_amount']), Decimal('95.00'))
+        self.assertEqual(len(response.data['items']), 19)
+
+    def test_create_order_with_unknown_product(self):
+        data = {'customer': self.customer.pk, 'items': [{'product': self.product.pk, 'quantity': 1},
+                                                        {'product': 999999, 'quantity': 1}]}
+        response = self.client.post(reverse('order-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('product', response.data['items'][1])
+
     def test_update_order_status(self):
         """Test order status update"""
         order = Order.objects.create(
@@ -122,4 +183,370 @@ class OrderAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         order.refresh_from_db()
-        self.assertEqual(order.status, 'shipped')
\ No newline at end of file
+        self.assertEqual(order.status, 'shipped')
+
+    def test_list_orders_with_cursor_pagination(self):
+        orders = [
+            Order.objects.create(customer=self.customer, total_amount=Decimal('10.99'))
+            for _ in range(3)
+        ]
+
+        response = self.client.get(f"{reverse('order-list')}?pagination=cursor&page_size=2")
+        self.assertEqual([order['id'] for order in response.data['results']], [orders[2].id, orders[1].id])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([order['id'] for order in response.data['results']], [orders[0].id])
+        self.assertIsNone(response.data['next'])
+
+    def test_list_orders_with_sparse_fields(self):
+        order = Order.objects.create(customer=self.customer, total_amount=Decimal('10.99'))
+        OrderItem.objects.create(order=order, product=self.product, quantity=1)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('order-list'), {'fields': 'id,status', 'pagination': 'cursor'})
+        self.assertEqual(response.data['results'], [{'id': order.id, 'status': 'pending'}])
+
+        response = self.client.get(reverse('order-list'), {'fields': 'id,customer', 'expand': 'customer'})
+        self.assertEqual(response.data['results'][0]['customer']['id'], self.customer.pk)
+
+    def test_list_orders_matches_model_serializer(self):
+        self.customer.user.first_name = "Jane"
+        self.customer.user.save()
+        for quantity in (1, 3):
+            order = Order.objects.create(customer=self.customer, total_amount=Decimal('10.99'), notes="Leave at door")
+            OrderItem.objects.create(order=order, product=self.product, quantity=quantity)
+
+        response = self.client.get(reverse('order-list'), {'pagination': 'cursor'})
+        expected = OrderSerializer(Order.objects.order_by('-id'), many=True).data
+        self.assertEqual(response.content, JSONRenderer().render({'next': None, 'previous': None, 'results': expected}))
+
+    def test_export_orders_as_ndjson(self):
+        self.customer.user.is_staff = True
+        self.customer.user.save()
+        self.client.force_authenticate(user=self.customer.user)
+        shipped = Order.objects.create(customer=self.customer, total_amount=Decimal('21.98'), status='shipped')
+        OrderItem.objects.create(order=shipped, product=self.product, quantity=2)
+        Order.objects.create(customer=self.customer, total_amount=Decimal('0'), status='pending')
+
+        response = self.client.get(reverse('order-export', kwargs={'file_format': 'ndjson'}), {'status': 'shipped'})
+        orders = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(orders), 1)
+        self.assertEqual(orders[0]['customer_email'], "john@example2.com")
+        self.assertEqual(orders[0]['items'][0]['product_sku'], "TEST001")
+
+        response = self.client.get(reverse('order-export', kwargs={'file_format': 'csv'}), {'status': 'bogus'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ConcurrentStockTest(TransactionTestCase):
+    """Many threads buying the last units of one product must never oversell"""
+
+    def setUp(self):
+        category = Category.objects.create(name="Flash sale")
+        self.product = Product.objects.create(
+            name="Hot item", price=Decimal('5.00'), category=category, sku="HOT001", stock_quantity=10
+        )
+
+    def buy(self, results):
+        for _ in range(200):
+            try:
+                with transaction.atomic():
+                    results.append(not Product.decrement_stock({self.product.pk: 1}))
+                return
+            except OperationalError:
+                # SQLite reports writer contention as "database is locked"; retry
+                time.sleep(0.01)
+            finally:
+                connection.close()
+
+    def test_no_oversell_under_concurrent_decrements(self):
+        results = []
+        threads = [threading.Thread(target=self.buy, args=(results,)) for _ in range(25)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.product.refresh_from_db()
+        self.assertEqual(results.count(True), 10)
+        self.assertEqual(self.product.stock_quantity, 0)
+
+
+class ReservationAPITest(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="holder", email="holder@example.com", password='testpassword')
+        self.customer = Customer.objects.get(user=user)
+        category = Category.objects.create(name="Sale")
+        self.product = Product.objects.create(
+            name="Sneakers", price=Decimal('50.00'), category=category, sku="HOLD001", stock_quantity=5
+        )
+        self.client.force_authenticate(user=user)
+
+    def reserve(self, quantity):
+        return self.client.post(reverse('reservation-list'), {
+            'customer': self.customer.pk, 'items': [{'product': self.product.pk, 'quantity': quantity}]
+        }, format='json')
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock_quantity
+
+    def test_hold_then_order(self):
+        response = self.reserve(3)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.stock(), 2)
+        self.assertEqual(self.reserve(3).status_code, status.HTTP_400_BAD_REQUEST)
+
+        order = self.client.post(reverse('order-list'), {
+            'customer': self.customer.pk, 'reservation': response.data['id']
+        }, format='json')
+        self.assertEqual(order.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(order.data['total_amount'], '150.00')
+        self.assertEqual(self.stock(), 2)
+
+        reservation = Reservation.objects.get(pk=response.data['id'])
+        self.assertEqual((reservation.status, reservation.order_id), ('committed', order.data['id']))
+        self.assertEqual(self.client.delete(reverse('reservation-detail', kwargs={'pk': reservation.pk})).status_code,
+                         status.HTTP_409_CONFLICT)
+
+    def test_release_returns_stock_once(self):
+        reservation_id = self.reserve(2).data['id']
+        url = reverse('reservation-detail', kwargs={'pk': reservation_id})
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.stock(), 5)
+
+    def test_reaper_returns_expired_holds(self):
+        reservation_id = self.reserve(4).data['id']
+        Reservation.objects.filter(pk=reservation_id).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        out = StringIO()
+        call_command('release_expired_reservations', stdout=out)
+        self.assertIn("Released 1", out.getvalue())
+        self.assertEqual(self.stock(), 5)
+
+        response = self.client.post(reverse('order-list'), {
+            'customer': self.customer.pk, 'reservation': reservation_id
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.count(), 0)
+
+
+class IdempotencyKeyTest(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="retrier", email="retrier@example.com", password='testpassword')
+        self.customer = Customer.objects.get(user=user)
+        category = Category.objects.create(name="Retries")
+        self.product = Product.objects.create(
+            name="Umbrella", price=Decimal('12.00'), category=category, sku="IDEM001", stock_quantity=10
+        )
+        self.client.force_authenticate(user=user)
+        self.data = {'customer': self.customer.pk, 'items': [{'product': self.product.pk, 'quantity': 2}]}
+
+    def post(self, key, data=None):
+        return self.client.post(reverse('order-list'), data or self.data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_stored_response(self):
+        first = self.post('checkout-1')
+        second = self.post('checkout-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Notification.objects.filter(channel='email').count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 8)
+
+        self.assertEqual(self.post('checkout-2').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_key_reused_with_other_body(self):
+        self.post('checkout-1')
+        other = {**self.data, 'items': [{'product': self.product.pk, 'quantity': 3}]}
+        self.assertEqual(self.post('checkout-1', other).status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_duplicate_of_in_flight_request_conflicts(self):
+        with patch('apps.orders.idempotency.store_response'):
+            self.post('checkout-1')
+        self.assertEqual(self.post('checkout-1').status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_crash_before_storing_response_rolls_back_action(self):
+        with patch('apps.orders.idempotency.store_response', side_effect=RuntimeError("worker killed")):
+            with self.assertRaises(RuntimeError):
+                self.post('checkout-1')
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.assertEqual(self.post('checkout-1').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_taken_over_request_does_not_commit(self):
+        def take_over(order):
+            # A duplicate took over the expired claim while this request ran
+            IdempotencyKey.objects.update(token=uuid.uuid4())
+
+        with patch('apps.orders.views.OrderViewSet.send_notification', side_effect=take_over):
+            response = self.post('checkout-1')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Order.objects.exists())
+        self.assertIsNone(IdempotencyKey.objects.get().response_status)
+
+    def test_raised_client_error_releases_key(self):
+        invalid = {**self.data, 'items': []}
+        self.assertEqual(self.post('checkout-1', invalid).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_status_update_is_idempotent(self):
+        order = Order.objects.create(customer=self.customer, total_amount=Decimal('0'))
+        url = reverse('order-update-status', kwargs={'pk': order.pk})
+        for _ in range(2):
+            response = self.client.patch(url, {'status': 'confirmed'}, format='json', HTTP_IDEMPOTENCY_KEY='confirm')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+
+    def test_expired_keys_are_purged(self):
+        self.post('checkout-1')
+        self.assertEqual(purge_expired_keys(), 0)
+        self.assertEqual(purge_expired_keys(now=timezone.now() + timedelta(days=2)), 1)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class BulkStatusTest(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="warehouse", email="warehouse@example.com", is_staff=True)
+        customer = Customer.objects.get(user=user)
+        Customer.objects.filter(pk=customer.pk).update(phone='+254700000001')
+        self.orders = {
+            order_status: Order.objects.create(customer=customer, total_amount=Decimal('5.00'), status=order_status)
+            for order_status in ('pending', 'confirmed', 'shipped', 'delivered')
+        }
+        self.client.force_authenticate(user=user)
+
+    def bulk(self, order_ids, target):
+        return self.client.post(reverse('order-bulk-status'), {'order_ids': order_ids, 'status': target}, format='json')
+
+    def test_reports_result_per_order(self):
+        ids = [order.pk for order in self.orders.values()] + [999999]
+        response = self.bulk(ids, 'shipped')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual([result['result'] for result in response.data['results']], [
+            'updated', 'updated', 'unchanged', 'invalid_transition', 'not_found'
+        ])
+        self.assertEqual(Order.objects.filter(status='shipped').count(), 3)
+        self.assertEqual(Order.objects.get(pk=self.orders['pending'].pk).version, 2)
+        self.assertEqual(
+            sorted(OrderStatusTransition.objects.values_list('from_status', 'to_status', 'version')),
+            [('confirmed', 'shipped', 2), ('pending', 'shipped', 2)]
+        )
+        self.assertEqual(
+            list(Notification.objects.values_list('body', flat=True).order_by('pk')),
+            [Order.status_message(self.orders[name].pk, 'shipped') for name in ('pending', 'confirmed')]
+        )
+
+    def test_order_changed_concurrently_is_a_conflict(self):
+        pending = self.orders['pending']
+        original_update = QuerySet.update
+
+        def racing_update(queryset, **kwargs):
+            # Another request cancels the order between the read and the guarded UPDATE
+            if kwargs.get('status') == 'shipped':
+                original_update(Order.objects.filter(pk=pending.pk), status='cancelled')
+            return original_update(queryset, **kwargs)
+
+        with patch.object(QuerySet, 'update', autospec=True, side_effect=racing_update):
+            response = self.bulk([pending.pk], 'shipped')
+        self.assertEqual(response.data['results'], [{'id': pending.pk, 'result': 'conflict', 'status': 'cancelled'}])
+        self.assertFalse(Notification.objects.exists())
+        self.assertFalse(OrderStatusTransition.objects.exists())
+
+    def test_same_move_by_another_request_is_a_conflict(self):
+        pending, confirmed = self.orders['pending'], self.orders['confirmed']
+        original_update = QuerySet.update
+        raced = []
+
+        def racing_update(queryset, **kwargs):
+            # Another request ships the order between the read and the guarded UPDATE
+            if kwargs.get('status') == 'shipped' and not raced:
+                raced.append(True)
+                transition_order(Order.objects.get(pk=pending.pk), 'shipped')
+            return original_update(queryset, **kwargs)
+
+        with patch.object(QuerySet, 'update', autospec=True, side_effect=racing_update):
+            response = self.bulk([pending.pk, confirmed.pk], 'shipped')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['result'] for result in response.data['results']], ['conflict', 'updated'])
+        self.assertEqual(
+            sorted(OrderStatusTransition.objects.values_list('order_id', 'version')),
+            [(pending.pk, 2), (confirmed.pk, 2)]
+        )
+
+    def test_requires_staff_and_valid_status(self):
+        self.assertEqual(self.bulk([], 'shipped').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.bulk([self.orders['pending'].pk], 'lost').status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.force_authenticate(User.objects.create_user(username="shopper"))
+        self.assertEqual(self.bulk([self.orders['pending'].pk], 'shipped').status_code, status.HTTP_403_FORBIDDEN)
+
+
+class OrderStatusTransitionTest(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="packer", email="packer@example.com")
+        self.order = Order.objects.create(customer=Customer.objects.get(user=user), total_amount=Decimal('5.00'))
+        self.url = reverse('order-update-status', kwargs={'pk': self.order.pk})
+        self.client.force_authenticate(user=user)
+
+    def test_change_bumps_version_and_logs_history(self):
+        response = self.client.patch(self.url, {'status': 'confirmed', 'version': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['status'], response.data['version']), ('confirmed', 2))
+        self.client.patch(self.url, {'status': 'shipped'}, format='json')
+
+        response = self.client.get(reverse('order-status-history', kwargs={'pk': self.order.pk}))
+        self.assertEqual(
+            [(row['from_status'], row['to_status'], row['version']) for row in response.data],
+            [('pending', 'confirmed', 2), ('confirmed', 'shipped', 3)]
+        )
+
+    def test_stale_version_conflicts(self):
+        self.client.patch(self.url, {'status': 'cancelled', 'version': 1}, format='json')
+        response = self.client.patch(self.url, {'status': 'shipped', 'version': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual((response.data['status'], response.data['version']), ('cancelled', 2))
+
+    def test_transitions_follow_the_graph(self):
+        Order.objects.filter(pk=self.order.pk).update(status='delivered')
+        response = self.client.patch(self.url, {'status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('delivered to pending', response.data['error'])
+        self.assertFalse(OrderStatusTransition.objects.exists())
+
+    def test_history_is_append_only(self):
+        self.client.patch(self.url, {'status': 'confirmed'}, format='json')
+        transition = OrderStatusTransition.objects.get()
+        transition.to_status = 'shipped'
+        with self.assertRaises(ValueError):
+            transition.save()
+
+    def test_generic_update_cannot_change_status(self):
+        Order.objects.filter(pk=self.order.pk).update(status='delivered')
+        response = self.client.patch(
+            reverse('order-detail', kwargs={'pk': self.order.pk}), {'status': 'cancelled', 'notes': 'Left at door'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.version, self.order.notes), ('delivered', 1, 'Left at door'))
+        self.assertFalse(OrderStatusTransition.objects.exists())
+
+    def test_generic_update_keeps_concurrent_transition(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        transition_order(Order.objects.get(pk=self.order.pk), 'cancelled')
+
+        serializer = OrderSerializer(stale, data={'notes': 'Ring twice'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.version, self.order.notes), ('cancelled', 2, 'Ring twice'))
@@ -0,0 +1,174 @@
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from apps.customers.models import CustomerOrderStats
+from apps.notifications.outbox import enqueue_sms_many
+from apps.orders.models import ORDERS_VERSION, Order, OrderStatusTransition
+from utils.cache_versions import bump_version_on_commit
+
+
+class InvalidTransition(Exception):
+    """The order's current status cannot move to the requested one"""
+
+
+class TransitionConflict(Exception):
+    """The order changed since it was read; status and version are its current values"""
+
+    def __init__(self, status, version):
+        super().__init__(status, version)
+        self.status = status
+        self.version = version
+
+
+def cancellation_delta(from_status, to_status):
+    """+1/-1 when an order leaves/enters cancelled, which customer stats do not count"""
+    return (from_status == 'cancelled') - (to_status == 'cancelled')
+
+
+def transition_order(order, status, expected_version=None, changed_by=None):
+    """Move one order to status if it is still at the version the caller saw.
+
+    The change is a compare-and-swap UPDATE on (status, version), so no row
+    lock is taken and a concurrent change makes this fail instead of being
+    overwritten. The change is appended to the status history.
+
+    Args:
+        order (Order): The order as read by the caller.
+        status (str): Target status.
+        expected_version (int): Version the client based the change on; the
+            order's own version by default.
+        changed_by (User): Who made the change.
+
+    Returns:
+        int: The order's new version.
+
+    Raises:
+        InvalidTransition: If ALLOWED_TRANSITIONS does not allow the move.
+        TransitionConflict: If the order is no longer at that version.
+    """
+    expected_version = order.version if expected_version is None else expected_version
+    if expected_version != order.version:
+        raise TransitionConflict(order.status, order.version)
+    if status not in Order.ALLOWED_TRANSITIONS[order.status]:
+        raise InvalidTransition(f"Cannot change status from {order.status} to {status}")
+
+    with transaction.atomic():
+        updated = Order.objects.filter(pk=order.pk, status=order.status, version=expected_version).update(
+            status=status, version=F('version') + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            current = Order.objects.filter(pk=order.pk).values_list('status', 'version').first()
+            raise TransitionConflict(*(current or (None, None)))
+        OrderStatusTransition.objects.create(
+            order_id=order.pk, from_status=order.status, to_status=status,
+            version=expected_version + 1, changed_by=changed_by
+        )
+        delta = cancellation_delta(order.status, status)
+        if delta:
+            CustomerOrderStats.add_orders({order.customer_id: (delta, delta * order.total_amount)})
+        bump_version_on_commit(ORDERS_VERSION)
+    return expected_version + 1
+
+
+def update_customer_stats(order_ids, delta_for):
+    """Apply each order's delta_for(order id) to its customer's stats in one UPDATE"""
+    if not order_ids:
+        return
+    deltas = defaultdict(lambda: [0, 0])
+    for pk, customer_id, total_amount in Order.objects.filter(pk__in=order_ids).values_list(
+        'pk', 'customer_id', 'total_amount'
+    ):
+        delta = delta_for(pk)
+        deltas[customer_id][0] += delta
+        deltas[customer_id][1] += delta * total_amount
+    CustomerOrderStats.add_orders({pk: tuple(delta) for pk, delta in deltas.items()})
+
+
+def bulk_transition(order_ids, status, changed_by=None):
+    """Move many orders to status with one guarded UPDATE per current status.
+
+    Each UPDATE only matches rows still at the status and version they were
+    read at, so an order changed by someone else in between is reported as
+    a conflict rather than overwritten. The status history rows and SMS for
+    the moved orders are inserted in bulk in the same transaction. Each
+    order gets its own status text; the texts differ, so the SMS gateway
+    sends them in parallel calls rather than coalescing them.
+
+    Args:
+        order_ids (list): Order ids, in the order results are wanted.
+        status (str): Target status.
+        changed_by (User): Who made the change.
+
+    Returns:
+        list: One {'id', 'result', 'status'} dict per distinct id, where result
+        is 'updated', 'unchanged', 'invalid_transition', 'conflict' or 'not_found'
+        and status is the order's status afterwards.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    with transaction.atomic():
+        rows = Order.objects.filter(pk__in=order_ids).values_list('pk', 'status', 'version')
+        current = {pk: (order_status, version) for pk, order_status, version in rows}
+        by_status = defaultdict(list)
+        for order_id, (order_status, _) in current.items():
+            if status in Order.ALLOWED_TRANSITIONS[order_status]:
+                by_status[order_status].append(order_id)
+
+        now = timezone.now()
+        attempted, updated = set(), set()
+        for from_status, ids in by_status.items():
+            attempted.update(ids)
+            expected_version = Case(
+                *[When(pk=pk, then=Value(current[pk][1])) for pk in ids],
+                output_field=models.PositiveIntegerField(),
+            )
+            count = Order.objects.filter(pk__in=ids, status=from_status, version=expected_version).update(
+                status=status, version=F('version') + 1, updated_at=now
+            )
+            if count == len(ids):
+                updated.update(ids)
+                continue
+            # Some rows moved under us. Another request may have made the same
+            # move, so only rows carrying this call's updated_at are provably ours
+            rows = Order.objects.filter(pk__in=ids).values_list('pk', 'status', 'version', 'updated_at')
+            for pk, order_status, version, updated_at in rows:
+                if order_status == status and version == current[pk][1] + 1 and updated_at == now:
+                    updated.add(pk)
+                else:
+                    current[pk] = (order_status, version)
+
+        if updated:
+            OrderStatusTransition.objects.bulk_create([
+                OrderStatusTransition(
+                    order_id=pk, from_status=current[pk][0], to_status=status,
+                    version=current[pk][1] + 1, changed_by=changed_by
+                )
+                for pk in sorted(updated)
+            ])
+            update_customer_stats(
+                [pk for pk in updated if cancellation_delta(current[pk][0], status)],
+                lambda pk: cancellation_delta(current[pk][0], status)
+            )
+            bump_version_on_commit(ORDERS_VERSION)
+            if status in Order.NOTIFY_STATUSES:
+                phones = (
+                    Order.objects.filter(pk__in=updated).exclude(customer__phone__isnull=True)
+                    .exclude(customer__phone='').values_list('pk', 'customer__phone').order_by('pk')
+                )
+                enqueue_sms_many((phone, Order.status_message(order_id, status)) for order_id, phone in phones)
+
+    results = []
+    for order_id in order_ids:
+        if order_id in updated:
+            results.append({'id': order_id, 'result': 'updated', 'status': status})
+        elif order_id not in current:
+            results.append({'id': order_id, 'result': 'not_found', 'status': None})
+        elif order_id in attempted:
+            results.append({'id': order_id, 'result': 'conflict', 'status': current[order_id][0]})
+        elif current[order_id][0] == status:
+            results.append({'id': order_id, 'result': 'unchanged', 'status': status})
+        else:
+            results.append({'id': order_id, 'result': 'invalid_transition', 'status': current[order_id][0]})
+    return results
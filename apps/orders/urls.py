@@ -1,9 +1,11 @@
 from rest_framework.routers import DefaultRouter
 
-from apps.orders.views import OrderViewSet
+from apps.orders.views import OrderViewSet, ReservationViewSet
 
 router = DefaultRouter()
 
+# Registered before the order routes so 'reservations' is not read as an order id
+router.register(r'reservations', ReservationViewSet, basename='reservation')
 router.register(r'', OrderViewSet, basename='order')
 
 urlpatterns = router.urls
@@ -1,15 +1,83 @@
 from django.db import transaction
-from rest_framework import status, viewsets
+from django.db.models import F
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 
-from apps.orders.models import Order
-from apps.orders.serializers import OrderSerializer, OrderCreateSerializer
-from utils.send_email import send_admin_email
-from utils.send_sms import send_sms_notification
+from apps.notifications.outbox import enqueue_admin_email, enqueue_sms
+from apps.orders.idempotency import idempotent
+from apps.orders.models import CUSTOMERS_VERSION, ORDERS_VERSION, Order, OrderStatusTransition, Reservation
+from apps.orders.reservations import release_reservation
+from apps.orders.serializers import (
+    OrderBulkStatusSerializer, OrderSerializer, OrderCreateSerializer, OrderStatusTransitionSerializer,
+    ReservationSerializer, ReservationCreateSerializer
+)
+from apps.orders.transitions import InvalidTransition, TransitionConflict, bulk_transition, transition_order
+from apps.products.facets import parse_bool
+from apps.products.models import PRODUCTS_VERSION
+from utils.conditional import ConditionalGetMixin
+from utils.exports import export_queryset, iterate_rows, parse_datetime_param
+from utils.fast_serialization import FastListMixin
+from utils.fieldsets import SparseFieldsetViewMixin
+from utils.pagination import OrderKeysetPagination, PageNumberPagination, SelectablePaginationMixin
 
+# Export column -> lookup on Order
+ORDER_EXPORT_FIELDS = {
+    'id': 'id',
+    'customer_id': 'customer_id',
+    'customer_email': 'customer__user__email',
+    'status': 'status',
+    'total_amount': 'total_amount',
+    'order_date': 'order_date',
+    'updated_at': 'updated_at',
+    'notes': 'notes',
+}
+ITEM_EXPORT_FIELDS = {
+    'item_id': 'items__id',
+    'product_id': 'items__product_id',
+    'product_sku': 'items__product__sku',
+    'quantity': 'items__quantity',
+    'unit_price': 'items__unit_price',
+    'total_price': 'items__total_price',
+}
 
-class OrderViewSet(viewsets.ModelViewSet):
+
+def export_values(queryset):
+    """values() rows of orders joined to their items, keyed by export column"""
+    fields = {**ORDER_EXPORT_FIELDS, **ITEM_EXPORT_FIELDS}
+    plain = [name for name, lookup in fields.items() if name == lookup]
+    aliased = {name: F(lookup) for name, lookup in fields.items() if name != lookup}
+    # An outer join, so orders without items still produce one row
+    return queryset.order_by('id', 'items__id').values(*plain, **aliased)
+
+
+def group_order_items(rows):
+    """Fold consecutive order/item rows into one order dict with an items list"""
+    order = None
+    for row in rows:
+        if order is None or order['id'] != row['id']:
+            if order is not None:
+                yield order
+            order = {name: row[name] for name in ORDER_EXPORT_FIELDS}
+            order['items'] = []
+        if row['item_id'] is not None:
+            order['items'].append({name: row[name] for name in ITEM_EXPORT_FIELDS})
+    if order is not None:
+        yield order
+
+
+class OrderViewSet(
+    ConditionalGetMixin, FastListMixin, SparseFieldsetViewMixin, SelectablePaginationMixin, viewsets.ModelViewSet
+):
+    pagination_classes = {
+        'page': PageNumberPagination,
+        'cursor': OrderKeysetPagination,
+    }
+    collection_versions = (ORDERS_VERSION, PRODUCTS_VERSION, CUSTOMERS_VERSION)
+    # Items embed product names and the order embeds the customer's name
+    resource_versions = (PRODUCTS_VERSION, CUSTOMERS_VERSION)
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -17,25 +85,24 @@ class OrderViewSet(viewsets.ModelViewSet):
         return OrderSerializer
 
     def get_queryset(self):
-        queryset = Order.objects.select_related('customer').prefetch_related('items__product').order_by('-id')
+        queryset = Order.objects.select_related('customer__user').prefetch_related('items__product').order_by('-id')
         if self.request.user.is_authenticated:
             queryset = queryset.filter(customer__user=self.request.user)
         return queryset
 
-    @transaction.atomic
+    @idempotent
     def create(self, request, *args, **kwargs):
         """Create order with notifications"""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        order = serializer.save()
-
-        for item in order.items.all():
-            product = item.product
-            product.stock_quantity -= item.quantity
-            product.save()
-
-        self.send_notification(order)
+        # Notifications are queued in the order's transaction and delivered by
+        # the dispatch_notifications worker, so checkout never waits on SMS/SMTP
+        with transaction.atomic():
+            order = serializer.save()
+            # Reload with the relations the notification and response read
+            order = Order.objects.select_related('customer__user').prefetch_related('items__product').get(pk=order.pk)
+            self.send_notification(order)
 
         response_serializer = OrderSerializer(order)
         headers = self.get_success_headers(response_serializer.data)
@@ -47,40 +114,42 @@ class OrderViewSet(viewsets.ModelViewSet):
         )
 
     def send_notification(self, order):
-        """Send SMS and email notifications"""
-        try:
-            order_summary = f"Order #{order.id} confirmed! Total:{order.total_amount}"
-            message = (f"Hello {self.request.user.username}, Your Order {order_summary}"
-                       f" has been received please be patient while it's being processed")
+        """Queue the customer SMS and admin email for a new order"""
+        order_summary = f"Order #{order.id} confirmed! Total:{order.total_amount}"
+        message = (f"Hello {self.request.user.username}, Your Order {order_summary}"
+                   f" has been received please be patient while it's being processed")
 
-            if order.customer.phone:
-                send_sms_notification(order.customer.phone, message)
+        if order.customer.phone:
+            enqueue_sms(order.customer.phone, message)
 
-            email_body = f"""
-                    New Order Placed!
+        email_body = f"""
+                New Order Placed!
 
-                    Order ID: #{order.id}
-                    Customer: {order.customer.user.first_name} {order.customer.user.last_name}
-                    Email: {order.customer.user.email}
-                    Phone: {order.customer.phone}
-                    Total Amount: ${order.total_amount}
-                    Order Date: {order.order_date}
+                Order ID: #{order.id}
+                Customer: {order.customer.user.first_name} {order.customer.user.last_name}
+                Email: {order.customer.user.email}
+                Phone: {order.customer.phone}
+                Total Amount: ${order.total_amount}
+                Order Date: {order.order_date}
 
-                    Items:
-                    """
+                Items:
+                """
 
-            for item in order.items.all():
-                email_body += f"- {item.quantity}x {item.product.name} @ ${item.unit_price} = ${item.total_price}\n"
+        for item in order.items.all():
+            email_body += f"- {item.quantity}x {item.product.name} @ ${item.unit_price} = ${item.total_price}\n"
 
-            if order.notes:
-                email_body += f"\nNotes: {order.notes}"
-            send_admin_email(f"New Order #{order.id}", email_body)
-        except Exception as e:
-            print(f"Notification error: {e}")
+        if order.notes:
+            email_body += f"\nNotes: {order.notes}"
+        enqueue_admin_email(f"New Order #{order.id}", email_body)
 
     @action(detail=True, methods=['patch'])
+    @idempotent
     def update_status(self, request, pk=None):
-        """Update order status"""
+        """Update order status.
+
+        An optional version (from the order's last read) makes the change
+        fail with 409 if someone else changed the order since.
+        """
         order = self.get_object()
         new_status = request.data.get('status')
 
@@ -89,18 +158,108 @@ class OrderViewSet(viewsets.ModelViewSet):
                 {'error': 'Invalid status'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        try:
+            expected_version = int(request.data.get('version', order.version))
+        except (TypeError, ValueError):
+            return Response({'error': 'Invalid version'}, status=status.HTTP_400_BAD_REQUEST)
 
-        order.status = new_status
-        order.save()
-
-        if new_status in ['shipped', 'delivered']:
-            try:
-                send_sms_notification(
-                    order.customer.phone,
-                   f"Order #{order.id} status updated: {new_status.title()}"
-                )
-            except Exception as e:
-                print(f"SMS notification error: {e}")
+        changed_by = request.user if request.user.is_authenticated else None
+        try:
+            with transaction.atomic():
+                transition_order(order, new_status, expected_version, changed_by)
+                if new_status in Order.NOTIFY_STATUSES and order.customer.phone:
+                    enqueue_sms(order.customer.phone, Order.status_message(order.id, new_status))
+        except InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except TransitionConflict as e:
+            return Response(
+                {'error': 'Order was changed by another request', 'status': e.status, 'version': e.version},
+                status=status.HTTP_409_CONFLICT
+            )
 
+        order.refresh_from_db()
         serializer = self.get_serializer(order)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'], url_path='status-history')
+    def status_history(self, request, pk=None):
+        """Status changes of an order, oldest first"""
+        order = self.get_object()
+        transitions = OrderStatusTransition.objects.filter(order=order).order_by('version')
+        return Response(OrderStatusTransitionSerializer(transitions, many=True).data)
+
+    @action(detail=False, methods=['post'], url_path='bulk-status', permission_classes=[IsAdminUser])
+    @idempotent
+    def bulk_status(self, request):
+        """Move many orders to one status, reporting the outcome per order"""
+        serializer = OrderBulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        target = serializer.validated_data['status']
+
+        results = bulk_transition(serializer.validated_data['order_ids'], target, request.user)
+        return Response({
+            'status': target,
+            'updated': sum(result['result'] == 'updated' for result in results),
+            'results': results,
+        })
+
+    @action(detail=False, methods=['get'], url_path=r'export/(?P<file_format>csv|ndjson)',
+            permission_classes=[IsAdminUser])
+    def export(self, request, file_format):
+        """Stream all orders as CSV (one row per item) or NDJSON (one order per line)"""
+        params = request.query_params
+        queryset = Order.objects.all()
+        since = parse_datetime_param(params, 'since')
+        if since:
+            queryset = queryset.filter(order_date__gte=since)
+        until = parse_datetime_param(params, 'until')
+        if until:
+            queryset = queryset.filter(order_date__lt=until)
+        statuses = [value for value in params.get('status', '').split(',') if value]
+        invalid = set(statuses) - set(dict(Order.STATUS_CHOICES))
+        if invalid:
+            raise ValidationError({'status': [f"Invalid status: {', '.join(sorted(invalid))}"]})
+        if statuses:
+            queryset = queryset.filter(status__in=statuses)
+
+        rows = iterate_rows(export_values(queryset))
+        compress = bool(parse_bool(params, 'gzip'))
+        if file_format == 'csv':
+            columns = [*ORDER_EXPORT_FIELDS, *ITEM_EXPORT_FIELDS]
+            return export_queryset(rows, columns, 'orders', file_format, compress)
+        return export_queryset(group_order_items(rows), [*ORDER_EXPORT_FIELDS, 'items'], 'orders', file_format, compress)
+
+
+class ReservationViewSet(
+    mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet
+):
+    """Time-boxed stock holds taken at checkout start and committed by creating an order"""
+
+    def get_serializer_class(self):
+        if self.action == 'create':
+            return ReservationCreateSerializer
+        return ReservationSerializer
+
+    def get_queryset(self):
+        queryset = Reservation.objects.prefetch_related('items')
+        if self.request.user.is_authenticated:
+            queryset = queryset.filter(customer__user=self.request.user)
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        """Hold stock for RESERVATION_TTL_SECONDS"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        reservation = serializer.save()
+
+        return Response(ReservationSerializer(reservation).data, status=status.HTTP_201_CREATED)
+
+    def destroy(self, request, *args, **kwargs):
+        """Abandon a checkout and return the held stock"""
+        reservation = self.get_object()
+        if not release_reservation(reservation.pk) and reservation.status == 'committed':
+            return Response(
+                {'error': 'Reservation was already used by an order'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
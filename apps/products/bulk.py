@@ -0,0 +1,200 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from apps.products.models import PRODUCTS_VERSION, Category, CategoryStats, Product
+from apps.products.serializers import ProductCreateSerializer, split_category_path
+from utils.cache_versions import bump_version_on_commit
+
+SKU_EXISTS_MESSAGE = "product with this sku already exists."
+
+
+class ProductBulkRowSerializer(ProductCreateSerializer):
+    """Validates a single upload row without touching the database.
+
+    SKU uniqueness and category existence are checked per batch by
+    BulkProductImporter instead of once per row.
+    """
+    category = serializers.IntegerField(required=False)
+
+    class Meta(ProductCreateSerializer.Meta):
+        extra_kwargs = {'sku': {'validators': []}}
+
+
+class BulkProductImporter:
+    """Validate and insert product rows in set-based batches.
+
+    Each batch costs one SKU lookup, one category lookup, one lookup for the
+    distinct category paths and one bulk_create per chunk, regardless of how
+    many rows it holds.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or settings.PRODUCT_BULK_UPLOAD_BATCH_SIZE
+
+    def run(self, rows):
+        """Import an iterable of row dicts.
+
+        Returns:
+            tuple: The created Product instances and the per-row errors.
+        """
+        created, errors = [], []
+        batch, numbers = [], []
+        for number, row in enumerate(rows, start=1):
+            batch.append(row)
+            numbers.append(number)
+            if len(batch) >= self.batch_size:
+                self._collect(batch, numbers, created, errors)
+                batch, numbers = [], []
+        if batch:
+            self._collect(batch, numbers, created, errors)
+        return created, errors
+
+    def _collect(self, batch, numbers, created, errors):
+        batch_created, batch_errors = self.import_batch(batch, numbers)
+        created.extend(batch_created)
+        errors.extend(batch_errors)
+
+    def import_batch(self, rows, numbers=None):
+        """Validate and insert one batch of rows.
+
+        Args:
+            rows (list): Row dicts.
+            numbers (list): Each row's number in the upload, reported with its
+                errors; defaults to its 1-based position in rows.
+
+        Returns:
+            tuple: The created Product instances and the per-row errors in
+            the bulk_upload format, ordered by row number.
+        """
+        numbers = numbers or range(1, len(rows) + 1)
+        errors = []
+        valid = []
+        for number, row in zip(numbers, rows):
+            serializer = ProductBulkRowSerializer(data=row)
+            if serializer.is_valid():
+                valid.append((number, row, dict(serializer.validated_data)))
+            else:
+                errors.append(self._error(number, row, serializer.errors))
+
+        valid = self._check_skus(valid, errors)
+        valid = self._check_categories(valid, errors)
+        created = self._create(valid, errors) if valid else []
+        # Each check appends its own failures; report them in input order
+        errors.sort(key=lambda error: error['row'])
+        return created, errors
+
+    def _create(self, valid, errors):
+        category_ids = self._resolve_category_paths(
+            {data['category_path'] for _, _, data in valid if not data.get('category') and data.get('category_path')}
+        )
+
+        products = []
+        for number, row, data in valid:
+            category_path = data.pop('category_path', None)
+            if not data.get('category'):
+                data['category'] = category_ids[category_path]
+            data['category_id'] = data.pop('category')
+            products.append((number, row, Product(**data)))
+
+        return self._insert(products, errors)
+
+    def _error(self, number, row, field_errors):
+        return {
+            'row': number,
+            'product_data': row,
+            'errors': field_errors
+        }
+
+    def _check_skus(self, valid, errors):
+        skus = [data['sku'] for _, _, data in valid]
+        taken = set(Product.objects.filter(sku__in=skus).values_list('sku', flat=True))
+
+        remaining = []
+        for number, row, data in valid:
+            if data['sku'] in taken:
+                errors.append(self._error(number, row, {'sku': [SKU_EXISTS_MESSAGE]}))
+            else:
+                taken.add(data['sku'])
+                remaining.append((number, row, data))
+        return remaining
+
+    def _check_categories(self, valid, errors):
+        requested = {data['category'] for _, _, data in valid if data.get('category')}
+        existing = set(Category.objects.filter(pk__in=requested).values_list('pk', flat=True))
+
+        remaining = []
+        for number, row, data in valid:
+            category_id = data.get('category')
+            if category_id and category_id not in existing:
+                errors.append(self._error(
+                    number, row, {'category': [f'Invalid pk "{category_id}" - object does not exist.']}
+                ))
+            else:
+                remaining.append((number, row, data))
+        return remaining
+
+    def _resolve_category_paths(self, paths):
+        """Map each distinct category path to a category id, creating missing nodes"""
+        if not paths:
+            return {}
+
+        split_paths = {path: split_category_path(path) for path in paths}
+        names = {name for parts in split_paths.values() for name in parts}
+        known = {}
+        for pk, name, parent_id in Category.objects.filter(name__in=names).order_by('pk').values_list(
+            'pk', 'name', 'parent_id'
+        ):
+            known.setdefault((parent_id, name), pk)
+
+        resolved = {}
+        for path, parts in split_paths.items():
+            parent_id = None
+            for name in parts:
+                if (parent_id, name) not in known:
+                    known[(parent_id, name)] = Category.objects.create(name=name, parent_id=parent_id).pk
+                parent_id = known[(parent_id, name)]
+            resolved[path] = parent_id
+        return resolved
+
+    def _insert(self, products, errors):
+        created = []
+        for start in range(0, len(products), self.batch_size):
+            chunk = products[start:start + self.batch_size]
+            try:
+                with transaction.atomic():
+                    Product.objects.bulk_create([product for _, _, product in chunk])
+                    self._update_rollups([product for _, _, product in chunk])
+                    # bulk_create sends no post_save, so invalidate validators here
+                    bump_version_on_commit(PRODUCTS_VERSION)
+                created.extend(product for _, _, product in chunk)
+            except IntegrityError:
+                # A concurrent writer claimed one of the SKUs; retry row by row
+                # so only the conflicting rows are reported.
+                created.extend(self._insert_rows(chunk, errors))
+        return created
+
+    def _insert_rows(self, chunk, errors):
+        created = []
+        for number, row, product in chunk:
+            product.pk = None
+            try:
+                with transaction.atomic():
+                    product.save()
+            except IntegrityError:
+                errors.append(self._error(number, row, {'sku': [SKU_EXISTS_MESSAGE]}))
+            else:
+                created.append(product)
+        return created
+
+    def _update_rollups(self, products):
+        totals = defaultdict(lambda: [0, Decimal('0')])
+        for product in products:
+            if product.is_active:
+                totals[product.category_id][0] += 1
+                totals[product.category_id][1] += Decimal(product.price)
+        for category_id, (count, price_sum) in totals.items():
+            CategoryStats.add_products(category_id, count, price_sum)
@@ -0,0 +1,118 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Count, Q
+from rest_framework.exceptions import ValidationError
+
+from apps.products.tree import get_category_tree
+
+TRUE_VALUES = {'1', 'true', 'yes'}
+FALSE_VALUES = {'0', 'false', 'no'}
+
+
+def parse_category_ids(params):
+    """Read ?category=1&category=2 or ?category=1,2 into a list of ids"""
+    ids = []
+    for value in params.getlist('category'):
+        for part in value.split(','):
+            part = part.strip()
+            if part:
+                try:
+                    ids.append(int(part))
+                except ValueError:
+                    raise ValidationError({'category': [f'"{part}" is not a valid category id.']})
+    return ids
+
+
+def parse_price(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValidationError({name: ["A valid number is required."]})
+
+
+def parse_bool(params, name):
+    value = params.get(name)
+    if value is None:
+        return None
+    if value.lower() in TRUE_VALUES:
+        return True
+    if value.lower() in FALSE_VALUES:
+        return False
+    raise ValidationError({name: ["Must be true or false."]})
+
+
+def filter_products(queryset, params):
+    """Apply the category, price range and in-stock filters from query params"""
+    category_ids = set()
+    tree = get_category_tree()
+    for category_id in parse_category_ids(params):
+        category_ids |= tree.get_descendant_ids(category_id)
+    if category_ids:
+        queryset = queryset.filter(category_id__in=category_ids)
+
+    min_price = parse_price(params, 'min_price')
+    if min_price is not None:
+        queryset = queryset.filter(price__gte=min_price)
+    max_price = parse_price(params, 'max_price')
+    if max_price is not None:
+        queryset = queryset.filter(price__lte=max_price)
+
+    in_stock = parse_bool(params, 'in_stock')
+    if in_stock is not None:
+        if 'available_stock' not in queryset.query.annotations:
+            queryset = queryset.with_available_stock()
+        queryset = queryset.filter(in_stock_condition() if in_stock else ~in_stock_condition())
+
+    return queryset
+
+
+def in_stock_condition():
+    # Unstriped products are matched on the indexed column alone
+    return Q(stock_stripes=0, stock_quantity__gt=0) | Q(stock_stripes__gt=0, available_stock__gt=0)
+
+
+def price_buckets():
+    """(low, high) pairs from PRODUCT_PRICE_FACET_BUCKETS; the last bucket is open ended"""
+    bounds = [Decimal(str(bound)) for bound in settings.PRODUCT_PRICE_FACET_BUCKETS]
+    return list(zip(bounds, bounds[1:] + [None]))
+
+
+def compute_facets(queryset):
+    """Count products per top-level category, price bucket and stock flag in one query"""
+    roots = get_category_tree().roots()
+    buckets = price_buckets()
+
+    aggregates = {
+        f'category_{root.id}': Count('id', filter=Q(category__tree_path__startswith=root.tree_path))
+        for root in roots
+    }
+    for index, (low, high) in enumerate(buckets):
+        condition = Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        aggregates[f'price_{index}'] = Count('id', filter=condition)
+    aggregates['in_stock'] = Count('id', filter=in_stock_condition())
+    aggregates['total'] = Count('id')
+
+    if 'available_stock' not in queryset.query.annotations:
+        queryset = queryset.with_available_stock()
+    counts = queryset.order_by().aggregate(**aggregates)
+
+    return {
+        'categories': [
+            {'id': root.id, 'name': root.name, 'count': counts[f'category_{root.id}']}
+            for root in roots
+        ],
+        'price': [
+            {'min': low, 'max': high, 'count': counts[f'price_{index}']}
+            for index, (low, high) in enumerate(buckets)
+        ],
+        'in_stock': {
+            'true': counts['in_stock'],
+            'false': counts['total'] - counts['in_stock'],
+        },
+    }
@@ -0,0 +1,179 @@
+import csv
+import io
+import json
+import os
+from contextlib import suppress
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.products.bulk import BulkProductImporter
+from apps.products.models import ImportJob
+
+CHUNK_SIZE = 64 * 1024
+# Seconds a claimed job is hidden from other workers. It is renewed after
+# every batch, so only a job whose worker died is picked up again.
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 3
+
+CONTENT_TYPE_FORMATS = {
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/json-lines': 'ndjson',
+    'text/csv': 'csv',
+}
+
+
+def spool_upload(stream, import_format):
+    """Copy a request body to disk in fixed-size chunks and create its job.
+
+    Args:
+        stream: A file-like request body.
+        import_format (str): 'ndjson' or 'csv'.
+
+    Returns:
+        ImportJob: The pending job.
+    """
+    os.makedirs(settings.PRODUCT_IMPORT_DIR, exist_ok=True)
+    job = ImportJob(format=import_format)
+    job.source_path = os.path.join(settings.PRODUCT_IMPORT_DIR, f"{job.id}.{import_format}")
+
+    with open(job.source_path, 'wb') as spool:
+        while True:
+            chunk = stream.read(CHUNK_SIZE) if stream is not None else b''
+            if not chunk:
+                break
+            spool.write(chunk)
+            job.bytes_received += len(chunk)
+
+    job.save()
+    return job
+
+
+def claim_job(now=None):
+    """Lease the oldest runnable import job to this worker, or return None.
+
+    Runnable means pending, or running under a lease that ran out because its
+    worker died. Jobs locked by another worker are skipped (SKIP LOCKED on
+    PostgreSQL), each claim counts as an attempt, and a job already claimed
+    MAX_ATTEMPTS times is failed instead of run again.
+    """
+    now = now or timezone.now()
+    while True:
+        with transaction.atomic():
+            job = (
+                ImportJob.objects.select_for_update(skip_locked=True)
+                .filter(Q(status='pending') | Q(status='running', lease_expires_at__lte=now))
+                .order_by('created_at').first()
+            )
+            if job is None:
+                return None
+            if job.attempts < MAX_ATTEMPTS:
+                ImportJob.objects.filter(pk=job.pk).update(
+                    status='running', attempts=F('attempts') + 1,
+                    lease_expires_at=now + timedelta(seconds=LEASE_SECONDS)
+                )
+                job.refresh_from_db()
+                return job
+            ImportJob.objects.filter(pk=job.pk).update(
+                status='failed', finished_at=now,
+                error_message=f"Worker stopped during the import {job.attempts} times; giving up"
+            )
+        _remove_spool(job)
+
+
+def _remove_spool(job):
+    with suppress(FileNotFoundError):
+        os.remove(job.source_path)
+
+
+def iter_rows(source, import_format):
+    """Yield (row number, row dict or parse error) from an open binary file"""
+    text = io.TextIOWrapper(source, encoding='utf-8', newline='')
+
+    if import_format == 'csv':
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            # Empty CSV cells mean "not provided", not an empty value
+            yield number, {key: value for key, value in row.items() if key and value != ''}
+        return
+
+    number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, ValueError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(row, dict):
+            yield number, ValueError("Each line must be a JSON object")
+            continue
+        yield number, row
+
+
+def run_import_job(job_id):
+    """Stream a spooled upload through BulkProductImporter, one batch at a time.
+
+    Progress is committed with each batch, so a job claimed again after its
+    worker died resumes after the last row it recorded. The spool file is
+    removed once the job completes or fails.
+    """
+    job = ImportJob.objects.get(pk=job_id)
+    if job.started_at is None:
+        job.started_at = timezone.now()
+    ImportJob.objects.filter(pk=job.pk).update(status='running', started_at=job.started_at)
+
+    importer = BulkProductImporter(batch_size=settings.PRODUCT_BULK_UPLOAD_BATCH_SIZE)
+    stored_errors = len(job.errors)
+    try:
+        with open(job.source_path, 'rb') as source:
+            batch, numbers, parse_errors = [], [], []
+            for number, row in iter_rows(source, job.format):
+                if number <= job.rows_processed:
+                    continue
+                if isinstance(row, Exception):
+                    parse_errors.append({'row': number, 'product_data': None, 'errors': {'non_field_errors': [str(row)]}})
+                else:
+                    batch.append(row)
+                    numbers.append(number)
+                if len(batch) + len(parse_errors) >= importer.batch_size:
+                    stored_errors = _import_batch(job, importer, batch, numbers, parse_errors, stored_errors)
+                    batch, numbers, parse_errors = [], [], []
+            if batch or parse_errors:
+                _import_batch(job, importer, batch, numbers, parse_errors, stored_errors)
+    except Exception as e:
+        ImportJob.objects.filter(pk=job.pk).update(
+            status='failed', error_message=str(e), finished_at=timezone.now()
+        )
+        raise
+    else:
+        ImportJob.objects.filter(pk=job.pk).update(status='completed', finished_at=timezone.now())
+    finally:
+        _remove_spool(job)
+
+
+@transaction.atomic
+def _import_batch(job, importer, batch, numbers, parse_errors, stored_errors):
+    # Rows and progress commit together, so rows_processed is a safe resume point
+    created, errors = importer.import_batch(batch, numbers) if batch else ([], [])
+    failed = sorted(parse_errors + errors, key=lambda error: error['row'])
+
+    update = {
+        'rows_processed': F('rows_processed') + len(batch) + len(parse_errors),
+        'rows_created': F('rows_created') + len(created),
+        'rows_failed': F('rows_failed') + len(failed),
+        'lease_expires_at': timezone.now() + timedelta(seconds=LEASE_SECONDS),
+    }
+    room = settings.PRODUCT_IMPORT_MAX_STORED_ERRORS - stored_errors
+    if failed and room > 0:
+        job.errors.extend(failed[:room])
+        update['errors'] = job.errors
+        stored_errors += min(room, len(failed))
+
+    ImportJob.objects.filter(pk=job.pk).update(**update)
+    return stored_errors
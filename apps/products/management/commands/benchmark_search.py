@@ -0,0 +1,66 @@
+import random
+import statistics
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.products.models import Category, Product
+from apps.products.search import BasicSearchBackend, get_search_backend
+from utils.benchmarking import percentile, time_calls
+
+WORDS = [
+    'organic', 'fresh', 'sourdough', 'whole', 'grain', 'wireless', 'laptop', 'premium', 'classic',
+    'leather', 'cotton', 'stainless', 'steel', 'bluetooth', 'speaker', 'coffee', 'roasted', 'dark',
+    'chocolate', 'vanilla', 'portable', 'charger', 'gaming', 'keyboard', 'mouse', 'ceramic', 'mug',
+    'running', 'shoes', 'waterproof', 'jacket', 'herbal', 'green', 'tea', 'olive', 'oil', 'spicy',
+]
+
+
+class Command(BaseCommand):
+    help = "Compare product search latency against a generated catalog (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000, help="Number of products to generate")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per query")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        queries = ['sourdough', 'wireless keyboard', 'dark chocolate', 'waterproof running jacket', 'BENCH-00042']
+        backends = [('indexed', get_search_backend()), ('basic', BasicSearchBackend())]
+
+        with transaction.atomic():
+            self._generate(options['products'], rng)
+            queryset = Product.objects.filter(is_active=True)
+
+            self.stdout.write(f"{'query':<28}{'backend':<10}{'p50 ms':>10}{'p95 ms':>10}{'hits':>8}")
+            for query in queries:
+                for label, backend in backends:
+                    timings, hits = time_calls(
+                        lambda: len(list(backend.search(queryset, query)[:20])), options['repeat']
+                    )
+                    self.stdout.write(
+                        f"{query:<28}{label:<10}{statistics.median(timings):>10.2f}"
+                        f"{percentile(timings, 95):>10.2f}{hits:>8}"
+                    )
+
+            transaction.set_rollback(True)
+
+    def _generate(self, count, rng):
+        self.stdout.write(f"Generating {count} products...")
+        category = Category.objects.create(name="Search benchmark", slug=f"search-benchmark-{rng.random()}")
+        # A long tail of filler words keeps the benchmark terms selective, as in a real catalog
+        filler = [f"w{n:x}" for n in range(20000)]
+        batch = []
+        for i in range(count):
+            batch.append(Product(
+                name=' '.join(rng.sample(filler, 2) + [rng.choice(WORDS)]).title(),
+                description=' '.join(rng.choices(filler, k=20) + rng.sample(WORDS, 2)),
+                price='9.99',
+                category=category,
+                sku=f"BENCH-{i:05}",
+            ))
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
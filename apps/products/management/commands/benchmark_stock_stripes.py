@@ -0,0 +1,60 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+
+from apps.products.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = "Measure concurrent single-unit orders per second on one product at different stripe counts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stripes', type=int, nargs='+', default=[0, 1, 4, 16])
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent buyers")
+        parser.add_argument('--seconds', type=float, default=3.0, help="Duration of each run")
+
+    def handle(self, *args, **options):
+        category = Category.objects.create(name="Stripe benchmark", slug=f"stripe-benchmark-{time.time()}")
+        product = Product.objects.create(
+            name="Stripe benchmark", price='1.00', category=category, sku=f"STRIPE-{time.time()}",
+            stock_quantity=10 ** 9,
+        )
+        try:
+            self.stdout.write(f"{'stripes':>8}{'orders/s':>12}{'conflicts':>11}")
+            for stripes in options['stripes']:
+                product.set_stock_stripes(stripes)
+                orders, conflicts = self._run(product.pk, options['threads'], options['seconds'])
+                self.stdout.write(f"{stripes:>8}{orders / options['seconds']:>12.1f}{conflicts:>11}")
+        finally:
+            category.delete()
+
+    def _run(self, product_id, thread_count, seconds):
+        deadline = time.monotonic() + seconds
+        counts = {'orders': 0, 'conflicts': 0}
+        lock = threading.Lock()
+
+        def buyer():
+            orders = conflicts = 0
+            try:
+                while time.monotonic() < deadline:
+                    try:
+                        with transaction.atomic():
+                            Product.decrement_stock({product_id: 1})
+                        orders += 1
+                    except OperationalError:
+                        # Lock timeouts / SQLite "database is locked"
+                        conflicts += 1
+            finally:
+                connection.close()
+            with lock:
+                counts['orders'] += orders
+                counts['conflicts'] += conflicts
+
+        threads = [threading.Thread(target=buyer) for _ in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts['orders'], counts['conflicts']
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.products.imports import claim_job, run_import_job
+
+
+class Command(BaseCommand):
+    help = "Run queued product imports (runs until stopped unless --once)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run the jobs waiting now, then exit")
+        parser.add_argument('--idle-sleep', type=float, default=1.0, help="Seconds to wait when no job is waiting")
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['idle_sleep'])
+                continue
+            try:
+                run_import_job(job.pk)
+            except Exception as e:
+                # The job is already marked failed; keep serving the others
+                self.stderr.write(f"Import {job.pk} failed: {e}")
+                continue
+            job.refresh_from_db()
+            self.stdout.write(f"Import {job.pk}: {job.rows_created} created, {job.rows_failed} failed")
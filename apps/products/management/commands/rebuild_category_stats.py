@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.products.stats import rebuild_category_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-category product count and price rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help="Only report categories whose rollups have drifted, without repairing them",
+        )
+
+    def handle(self, *args, **options):
+        drifted = rebuild_category_stats(fix=not options['verify'])
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Category rollups are up to date"))
+            return
+
+        ids = ', '.join(str(pk) for pk in sorted(drifted))
+        if options['verify']:
+            raise CommandError(f"{len(drifted)} category rollups have drifted: {ids}")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(drifted)} category rollups: {ids}"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Spread a hot product's stock over N bucket rows (0 folds it back into the product row)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('sku')
+        parser.add_argument('stripes', type=int)
+
+    def handle(self, *args, **options):
+        if not 0 <= options['stripes'] <= 256:
+            raise CommandError("stripes must be between 0 and 256")
+        try:
+            product = Product.objects.get(sku=options['sku'])
+        except Product.DoesNotExist:
+            raise CommandError(f"No product with SKU {options['sku']}")
+
+        product.set_stock_stripes(options['stripes'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{product.sku}: {product.get_available_stock()} units over {options['stripes']} stripe(s)"
+        ))
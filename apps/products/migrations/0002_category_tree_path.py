@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:22
+
+from django.db import migrations, models
+
+
+def backfill_tree_paths(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    children = {}
+    for pk, parent_id in Category.objects.values_list('id', 'parent_id'):
+        children.setdefault(parent_id, []).append(pk)
+
+    updates = []
+    stack = [(pk, '', 0) for pk in children.get(None, [])]
+    while stack:
+        pk, parent_path, level = stack.pop()
+        path = f'{parent_path}{pk}/'
+        updates.append(Category(pk=pk, tree_path=path, level=level))
+        stack.extend((child, path, level + 1) for child in children.get(pk, []))
+
+    Category.objects.bulk_update(updates, ['tree_path', 'level'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='level',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='tree_path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=1024),
+        ),
+        migrations.RunPython(backfill_tree_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_category_stats(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    CategoryStats = apps.get_model('products', 'CategoryStats')
+    Product = apps.get_model('products', 'Product')
+
+    paths = dict(Category.objects.values_list('id', 'tree_path'))
+    stats = {pk: CategoryStats(category_id=pk) for pk in paths}
+
+    totals = (
+        Product.objects.filter(is_active=True)
+        .values('category_id')
+        .annotate(count=Count('id'), price_sum=Sum('price'))
+    )
+    for row in totals:
+        direct = stats[row['category_id']]
+        direct.product_count = row['count']
+        direct.price_sum = row['price_sum']
+        for pk in paths[row['category_id']].split('/'):
+            if pk:
+                stats[int(pk)].subtree_product_count += row['count']
+                stats[int(pk)].subtree_price_sum += row['price_sum']
+
+    CategoryStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_category_tree_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='products.category')),
+                ('product_count', models.IntegerField(default=0)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('subtree_product_count', models.IntegerField(default=0)),
+                ('subtree_price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+        ),
+        migrations.RunPython(backfill_category_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+from django.db import migrations
+
+# The search index as of this migration, kept here rather than imported from
+# apps.products.search so later changes to that module cannot alter history
+
+POSTGRES_SQL = [
+    "ALTER TABLE products_product ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """
+    CREATE OR REPLACE FUNCTION products_product_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.sku, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS products_product_search_vector_update ON products_product",
+    """
+    CREATE TRIGGER products_product_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, description, sku ON products_product
+    FOR EACH ROW EXECUTE FUNCTION products_product_search_vector()
+    """,
+    "UPDATE products_product SET name = name WHERE search_vector IS NULL",
+    """
+    CREATE INDEX IF NOT EXISTS products_product_search_vector_idx
+    ON products_product USING GIN (search_vector)
+    """,
+]
+
+SQLITE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_product_fts
+    USING fts5(name, description, sku, content='products_product', content_rowid='id')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_product_fts_insert AFTER INSERT ON products_product BEGIN
+        INSERT INTO products_product_fts(rowid, name, description, sku)
+        VALUES (new.id, new.name, coalesce(new.description, ''), new.sku);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_product_fts_delete AFTER DELETE ON products_product BEGIN
+        INSERT INTO products_product_fts(products_product_fts, rowid, name, description, sku)
+        VALUES ('delete', old.id, old.name, coalesce(old.description, ''), old.sku);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_product_fts_update AFTER UPDATE ON products_product BEGIN
+        INSERT INTO products_product_fts(products_product_fts, rowid, name, description, sku)
+        VALUES ('delete', old.id, old.name, coalesce(old.description, ''), old.sku);
+        INSERT INTO products_product_fts(rowid, name, description, sku)
+        VALUES (new.id, new.name, coalesce(new.description, ''), new.sku);
+    END
+    """,
+    "INSERT INTO products_product_fts(products_product_fts) VALUES ('rebuild')",
+]
+
+
+def create_search_index(apps, schema_editor):
+    statements = {'postgresql': POSTGRES_SQL, 'sqlite': SQLITE_SQL}.get(schema_editor.connection.vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_category_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, migrations.RunPython.noop),
+    ]
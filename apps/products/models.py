@@ -1,6 +1,24 @@
-from django.db import models
+import uuid
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Concat, Substr
+from django.utils import timezone
 from django.utils.text import slugify
 
+from utils.cache_versions import bump_version_on_commit
+
+TREE_PATH_SEPARATOR = '/'
+STOCK_UPDATE_ATTEMPTS = 3
+# Cache version namespace bumped whenever any product row changes
+PRODUCTS_VERSION = 'products'
+
+
+def path_ids(tree_path):
+    """Primary keys encoded in a materialized tree path, root first"""
+    return [int(pk) for pk in tree_path.split(TREE_PATH_SEPARATOR) if pk]
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -14,39 +32,101 @@ class Category(models.Model):
         related_name='children'
     )
 
+    # Materialized path of primary keys from the root down to this node,
+    # e.g. '1/5/12/'. Kept in sync by save() so subtree lookups are a
+    # single indexed prefix match.
+    tree_path = models.CharField(max_length=1024, db_index=True, blank=True, editable=False)
+    level = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
 
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'parent' not in update_fields:
+            super().save(*args, **kwargs)
+            return
+
+        with transaction.atomic():
+            stored_path = ''
+            if self.pk:
+                stored_path = Category.objects.filter(pk=self.pk).values_list('tree_path', flat=True).first() or ''
+
+            parent_path, parent_level = '', -1
+            if self.parent_id:
+                parent_path, parent_level = Category.objects.values_list('tree_path', 'level').get(pk=self.parent_id)
+                if stored_path and parent_path.startswith(stored_path):
+                    raise ValueError("A category cannot be moved under itself or one of its descendants")
+
+            adding = self._state.adding
+            super().save(*args, **kwargs)
+            if adding:
+                CategoryStats.objects.get_or_create(category=self)
+            self._move_subtree(stored_path, f"{parent_path}{self.pk}{TREE_PATH_SEPARATOR}", parent_level + 1)
+
+    def _move_subtree(self, stored_path, new_path, new_level):
+        """Rewrite the materialized path of this node and all of its descendants"""
+        if stored_path == new_path:
+            return
+
+        if not stored_path:
+            Category.objects.filter(pk=self.pk).update(tree_path=new_path, level=new_level)
+        else:
+            # Carry the subtree totals from the old ancestors to the new ones
+            stats = CategoryStats.objects.filter(category_id=self.pk).first()
+            if stats:
+                CategoryStats.shift(path_ids(stored_path)[:-1], -stats.subtree_product_count, -stats.subtree_price_sum)
+                CategoryStats.shift(path_ids(new_path)[:-1], stats.subtree_product_count, stats.subtree_price_sum)
+
+            old_level = stored_path.count(TREE_PATH_SEPARATOR) - 1
+            Category.objects.filter(tree_path__startswith=stored_path).update(
+                tree_path=Concat(Value(new_path), Substr('tree_path', len(stored_path) + 1)),
+                level=F('level') + (new_level - old_level),
+            )
+        self.tree_path = new_path
+        self.level = new_level
+
+    @property
+    def ancestor_ids(self):
+        """Primary keys of all ancestors, root first"""
+        return path_ids(self.tree_path)[:-1]
 
     def get_ancestors(self):
         """Get all ancestor categories"""
-        ancestors = []
-        current = self.parent
-        while current:
-            ancestors.append(current)
-            current = current.parent
-        return reversed(ancestors)
-
-    def get_descendants(self):
+        return Category.objects.filter(pk__in=self.ancestor_ids).order_by('level')
+
+    def get_descendants(self, include_self=False):
         """Get all descendant categories"""
-        descendants = []
-        for child in self.children.all():
-            descendants.append(child)
-            descendants.extend(child.get_descendants())
+        descendants = Category.objects.filter(tree_path__startswith=self.tree_path).order_by('tree_path')
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
         return descendants
 
     def get_root(self):
         """Get the root category"""
-        if not self.parent:
+        if not self.parent_id:
             return self
-        return self.get_ancestors().filter(level=0).first()
+        return Category.objects.get(pk=self.ancestor_ids[0])
 
     def __str__(self):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+    def with_available_stock(self):
+        """Annotate available_stock: stock_quantity plus, for striped products, the bucket rows"""
+        bucket_total = (
+            StockBucket.objects.filter(product=OuterRef('pk')).order_by()
+            .values('product').annotate(total=Sum('quantity')).values('total')
+        )
+        return self.annotate(available_stock=Case(
+            When(stock_stripes=0, then=F('stock_quantity')),
+            default=F('stock_quantity') + Coalesce(Subquery(bucket_total), 0),
+            output_field=models.IntegerField(),
+        ))
+
+
 class Product(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
@@ -58,7 +138,304 @@ class Product(models.Model):
     )
     sku = models.CharField(max_length=50, unique=True)
     stock_quantity = models.PositiveIntegerField(default=0)
+    # When non-zero, stock is spread over this many StockBucket rows so
+    # concurrent orders for a hot SKU do not all lock the product row.
+    stock_stripes = models.PositiveSmallIntegerField(default=0)
     is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination over ?ordering=category
+            models.Index(fields=['category', 'id'], name='product_category_id_idx'),
+            # Faceted filtering by category, price range and stock
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            models.Index(fields=['is_active', 'price'], name='product_active_price_idx'),
+            models.Index(fields=['is_active', 'stock_quantity'], name='product_active_stock_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'price', 'category', 'is_active'} & set(update_fields):
+            super().save(*args, **kwargs)
+            return
+
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = Product.objects.select_for_update().filter(pk=self.pk).values(
+                    'category_id', 'price', 'is_active'
+                ).first()
+
+            super().save(*args, **kwargs)
+
+            before = (previous['category_id'], previous['price']) if previous and previous['is_active'] else None
+            after = (self.category_id, Decimal(self.price)) if self.is_active else None
+            if before == after:
+                return
+            if before and after and before[0] == after[0]:
+                CategoryStats.add_products(after[0], 0, after[1] - before[1])
+                return
+            if before:
+                CategoryStats.add_products(before[0], -1, -before[1])
+            if after:
+                CategoryStats.add_products(after[0], 1, after[1])
+
+    def get_available_stock(self):
+        """Stock available to sell, using the available_stock annotation when present"""
+        if hasattr(self, 'available_stock'):
+            return self.available_stock
+        if not self.stock_stripes:
+            return self.stock_quantity
+        return self.stock_quantity + (self.stock_buckets.aggregate(total=Sum('quantity'))['total'] or 0)
+
+    def set_stock_stripes(self, stripes, total=None):
+        """Spread the product's stock evenly over `stripes` buckets, or fold it back with 0.
+
+        Args:
+            stripes (int): Number of buckets; 0 turns striping off.
+            total (int): New stock level; the current one is kept by default.
+        """
+        with transaction.atomic():
+            product = Product.objects.select_for_update().with_available_stock().get(pk=self.pk)
+            total = product.available_stock if total is None else total
+            StockBucket.objects.filter(product_id=self.pk).delete()
+            if stripes:
+                share, extra = divmod(total, stripes)
+                StockBucket.objects.bulk_create([
+                    StockBucket(product_id=self.pk, stripe=stripe, quantity=share + (stripe < extra))
+                    for stripe in range(stripes)
+                ])
+            stock_quantity = 0 if stripes else total
+            Product.objects.filter(pk=self.pk).update(
+                stock_quantity=stock_quantity, stock_stripes=stripes, updated_at=timezone.now()
+            )
+            bump_version_on_commit(PRODUCTS_VERSION)
+        self.stock_quantity, self.stock_stripes = stock_quantity, stripes
+        self.__dict__.pop('available_stock', None)
+
+    @classmethod
+    def decrement_stock(cls, quantities):
+        """Take stock for several products at once, all or nothing.
+
+        A single conditional UPDATE (stock_quantity >= n per row) covers every
+        product, listed in id order so concurrent checkouts lock rows in the
+        same order. Striped products take from their buckets instead and
+        leave the product row alone. If anything lacks stock the whole
+        update is rolled back.
+
+        Args:
+            quantities (dict): Quantity to take per product id.
+
+        Returns:
+            dict: Available stock per product id that could not be served;
+            empty when every decrement succeeded.
+        """
+        ids = sorted(quantities)
+        if not ids:
+            return {}
+        striped = set(cls.objects.filter(pk__in=ids, stock_stripes__gt=0).values_list('pk', flat=True))
+        plain = [pk for pk in ids if pk not in striped]
+        amount = Case(
+            *[When(pk=pk, then=Value(quantities[pk])) for pk in plain],
+            output_field=models.PositiveIntegerField(),
+        )
+        available = {}
+        for _ in range(STOCK_UPDATE_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    if plain:
+                        updated = cls.objects.filter(pk__in=plain, stock_quantity__gte=amount).update(
+                            stock_quantity=F('stock_quantity') - amount,
+                            updated_at=timezone.now(),
+                        )
+                        if updated != len(plain):
+                            raise _StockShortfall
+                    for pk in sorted(striped):
+                        if not StockBucket.take(pk, quantities[pk]):
+                            raise _StockShortfall
+            except _StockShortfall:
+                available = dict(cls.objects.filter(pk__in=ids).with_available_stock().values_list(
+                    'pk', 'available_stock'
+                ))
+                shortfall = {pk: available.get(pk, 0) for pk in ids if available.get(pk, 0) < quantities[pk]}
+                if shortfall:
+                    return shortfall
+                # Stock was restored between the update and the re-read; try again
+                continue
+            bump_version_on_commit(PRODUCTS_VERSION)
+            return {}
+        return {pk: available.get(pk, 0) for pk in ids}
+
+    @classmethod
+    def increment_stock(cls, quantities):
+        """Return stock for several products in one UPDATE"""
+        ids = sorted(quantities)
+        if not ids:
+            return
+        striped = set(cls.objects.filter(pk__in=ids, stock_stripes__gt=0).values_list('pk', flat=True))
+        plain = [pk for pk in ids if pk not in striped]
+        if plain:
+            amount = Case(
+                *[When(pk=pk, then=Value(quantities[pk])) for pk in plain],
+                output_field=models.PositiveIntegerField(),
+            )
+            cls.objects.filter(pk__in=plain).update(
+                stock_quantity=F('stock_quantity') + amount, updated_at=timezone.now()
+            )
+        for pk in sorted(striped):
+            StockBucket.give(pk, quantities[pk])
+        bump_version_on_commit(PRODUCTS_VERSION)
+
+
+class _StockShortfall(Exception):
+    pass
+
+
+class StockBucket(models.Model):
+    """One stripe of a striped product's stock; the product's stock is the sum of its buckets"""
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_buckets'
+    )
+    stripe = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'stripe'], name='stock_bucket_product_stripe_uniq'),
+        ]
+
+    @classmethod
+    def _random_bucket(cls, product_id, minimum=0):
+        return Subquery(
+            cls.objects.filter(product_id=product_id, quantity__gte=minimum).order_by('?').values('pk')[:1]
+        )
+
+    @classmethod
+    def take(cls, product_id, quantity):
+        """Take stock from a random bucket that can cover it, draining several only as a last resort.
+
+        Returns:
+            bool: False if the buckets together hold less than quantity.
+        """
+        for _ in range(STOCK_UPDATE_ATTEMPTS):
+            taken = cls.objects.filter(
+                pk=cls._random_bucket(product_id, quantity), quantity__gte=quantity
+            ).update(quantity=F('quantity') - quantity)
+            if taken:
+                return True
+
+        # No single bucket is big enough; lock them in stripe order and drain
+        buckets = list(cls.objects.select_for_update().filter(product_id=product_id, quantity__gt=0).order_by('stripe'))
+        if sum(bucket.quantity for bucket in buckets) < quantity:
+            return False
+        remaining = quantity
+        for bucket in buckets:
+            amount = min(bucket.quantity, remaining)
+            cls.objects.filter(pk=bucket.pk).update(quantity=F('quantity') - amount)
+            remaining -= amount
+            if not remaining:
+                break
+        return True
+
+    @classmethod
+    def give(cls, product_id, quantity):
+        """Return stock to a random bucket"""
+        cls.objects.filter(pk=cls._random_bucket(product_id)).update(quantity=F('quantity') + quantity)
+
+    def __str__(self):
+        return f"{self.product_id} stripe {self.stripe}: {self.quantity}"
+
+
+class CategoryStats(models.Model):
+    """Active product count and price sum for a category, directly and for its whole subtree"""
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    product_count = models.IntegerField(default=0)
+    price_sum = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    subtree_product_count = models.IntegerField(default=0)
+    subtree_price_sum = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    @property
+    def average_price(self):
+        if not self.subtree_product_count:
+            return 0
+        return round(self.subtree_price_sum / self.subtree_product_count, 2)
+
+    @classmethod
+    def add_products(cls, category_id, count, price_sum):
+        """Apply a product delta to a category and the subtree totals of its ancestors"""
+        tree_path = Category.objects.values_list('tree_path', flat=True).get(pk=category_id)
+        cls.objects.filter(category_id__in=path_ids(tree_path)).update(
+            product_count=F('product_count') + Case(When(category_id=category_id, then=Value(count)), default=0),
+            price_sum=F('price_sum') + Case(
+                When(category_id=category_id, then=Value(price_sum)),
+                default=Value(0),
+                output_field=models.DecimalField(max_digits=18, decimal_places=2),
+            ),
+            subtree_product_count=F('subtree_product_count') + count,
+            subtree_price_sum=F('subtree_price_sum') + price_sum,
+        )
+
+    @classmethod
+    def shift(cls, category_ids, count, price_sum):
+        """Apply a delta to the subtree totals of the given categories only"""
+        if category_ids and (count or price_sum):
+            cls.objects.filter(category_id__in=category_ids).update(
+                subtree_product_count=F('subtree_product_count') + count,
+                subtree_price_sum=F('subtree_price_sum') + price_sum,
+            )
+
+    def __str__(self):
+        return f"{self.category} stats"
+
+
+class ImportJob(models.Model):
+    """Background catalog import fed from a streamed NDJSON or CSV upload"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    FORMAT_CHOICES = [
+        ('ndjson', 'NDJSON'),
+        ('csv', 'CSV'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    source_path = models.CharField(max_length=1024)
+    bytes_received = models.BigIntegerField(default=0)
+    rows_processed = models.PositiveIntegerField(default=0)
+    rows_created = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    error_message = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def rows_per_second(self):
+        if not self.started_at:
+            return 0
+        elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return round(self.rows_processed / elapsed, 1) if elapsed > 0 else 0
+
+    def __str__(self):
+        return f"Import {self.id} ({self.status})"
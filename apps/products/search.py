@@ -0,0 +1,144 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    return TERM_RE.findall(query or '')
+
+
+class BasicSearchBackend:
+    """Portable fallback: every term must appear in name, description or sku"""
+
+    def install(self, schema_editor):
+        pass
+
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        for term in terms:
+            queryset = queryset.filter(
+                Q(name__icontains=term) | Q(description__icontains=term) | Q(sku__icontains=term)
+            )
+        return queryset
+
+
+class PostgresSearchBackend:
+    """Ranked search over a trigger-maintained tsvector column with a GIN index"""
+    tsquery = "websearch_to_tsquery('english', %s)"
+
+    install_sql = [
+        "ALTER TABLE products_product ADD COLUMN IF NOT EXISTS search_vector tsvector",
+        """
+        CREATE OR REPLACE FUNCTION products_product_search_vector() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce(NEW.sku, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS products_product_search_vector_update ON products_product",
+        """
+        CREATE TRIGGER products_product_search_vector_update
+        BEFORE INSERT OR UPDATE OF name, description, sku ON products_product
+        FOR EACH ROW EXECUTE FUNCTION products_product_search_vector()
+        """,
+        "UPDATE products_product SET name = name WHERE search_vector IS NULL",
+        """
+        CREATE INDEX IF NOT EXISTS products_product_search_vector_idx
+        ON products_product USING GIN (search_vector)
+        """,
+    ]
+
+    def install(self, schema_editor):
+        for sql in self.install_sql:
+            schema_editor.execute(sql)
+
+    def search(self, queryset, query):
+        if not search_terms(query):
+            return queryset.none()
+        matches = RawSQL(f"products_product.search_vector @@ {self.tsquery}", (query,), output_field=BooleanField())
+        rank = RawSQL(f"ts_rank(products_product.search_vector, {self.tsquery})", (query,), output_field=FloatField())
+        return queryset.filter(matches).annotate(search_rank=rank).order_by('-search_rank', 'id')
+
+
+class SQLiteSearchBackend:
+    """Ranked search over an FTS5 external-content table, for local development and tests"""
+
+    install_sql = [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS products_product_fts
+        USING fts5(name, description, sku, content='products_product', content_rowid='id')
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS products_product_fts_insert AFTER INSERT ON products_product BEGIN
+            INSERT INTO products_product_fts(rowid, name, description, sku)
+            VALUES (new.id, new.name, coalesce(new.description, ''), new.sku);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS products_product_fts_delete AFTER DELETE ON products_product BEGIN
+            INSERT INTO products_product_fts(products_product_fts, rowid, name, description, sku)
+            VALUES ('delete', old.id, old.name, coalesce(old.description, ''), old.sku);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS products_product_fts_update AFTER UPDATE ON products_product BEGIN
+            INSERT INTO products_product_fts(products_product_fts, rowid, name, description, sku)
+            VALUES ('delete', old.id, old.name, coalesce(old.description, ''), old.sku);
+            INSERT INTO products_product_fts(rowid, name, description, sku)
+            VALUES (new.id, new.name, coalesce(new.description, ''), new.sku);
+        END
+        """,
+        "INSERT INTO products_product_fts(products_product_fts) VALUES ('rebuild')",
+    ]
+
+    def install(self, schema_editor):
+        for sql in self.install_sql:
+            schema_editor.execute(sql)
+
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        # Quote every term so user input is never parsed as FTS5 syntax
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # Join the FTS table once so matching and bm25 ranking share a single index scan
+        return queryset.extra(
+            select={'search_rank': '-products_product_fts.rank'},
+            tables=['products_product_fts'],
+            where=['products_product_fts.rowid = products_product.id', 'products_product_fts MATCH %s'],
+            params=[match],
+        ).order_by('-search_rank', 'id')
+
+
+VENDOR_BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_search_backend(vendor=None):
+    """Return the configured product search backend.
+
+    PRODUCT_SEARCH_BACKEND may name a backend class; otherwise one is picked
+    for the database vendor, falling back to BasicSearchBackend.
+    """
+    if settings.PRODUCT_SEARCH_BACKEND:
+        return import_string(settings.PRODUCT_SEARCH_BACKEND)()
+    return VENDOR_BACKENDS.get(vendor or connection.vendor, BasicSearchBackend)()
+
+
+def install_search_index(schema_editor):
+    """Create or repair the search index for the connection's database"""
+    get_search_backend(schema_editor.connection.vendor).install(schema_editor)
@@ -1,6 +1,17 @@
 from rest_framework import serializers
 
-from apps.products.models import Category, Product
+from apps.products.models import Category, ImportJob, Product
+from apps.products.tree import get_category_tree
+from utils.fast_serialization import ValuesSerializerMixin
+from utils.fieldsets import SparseFieldsetMixin
+
+
+def get_context_tree(context):
+    """Fetch the category snapshot once per serialization and share it via the context"""
+    tree = context.get('category_tree')
+    if tree is None:
+        tree = context['category_tree'] = get_category_tree()
+    return tree
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -12,20 +23,54 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'parent', 'children', 'path']
 
     def get_children(self, obj):
+        tree = get_context_tree(self.context)
+        if obj.pk in tree:
+            return tree.render_children(obj.pk)
         if obj.children.exists():
             return CategorySerializer(obj.children.all(), many=True).data
         return []
 
     def get_path(self, obj):
         """Return full category path like 'All Products > Bakery > Bread'"""
+        tree = get_context_tree(self.context)
+        if obj.pk in tree:
+            return tree.get_path(obj.pk)
         path = [ancestor.name for ancestor in obj.get_ancestors()]
         path.append(obj.name)
         return ' > '.join(path)
 
+    def validate_parent(self, parent):
+        if parent and self.instance and self.instance.pk in parent.ancestor_ids + [parent.pk]:
+            raise serializers.ValidationError("A category cannot be moved under itself or one of its descendants")
+        return parent
+
+
+class AvailableStockField(serializers.IntegerField):
+    """stock_quantity as clients see it, summing the buckets of striped products"""
+
+    def get_attribute(self, instance):
+        return instance.get_available_stock()
+
+
+class ProductSerializer(SparseFieldsetMixin, ValuesSerializerMixin, serializers.ModelSerializer):
+    category_path = serializers.SerializerMethodField()
+    category_name = serializers.SerializerMethodField()
+    stock_quantity = AvailableStockField(min_value=0, max_value=2147483647, required=False)
 
-class ProductSerializer(serializers.ModelSerializer):
-    category_path = serializers.CharField(source='category.get_path', read_only=True)
-    category_name = serializers.CharField(source='category.name', read_only=True)
+    expandable_fields = {
+        'category': (serializers.SerializerMethodField, {'method_name': 'get_category_detail'}),
+    }
+    field_requirements = {
+        'category_name': {'only': ['category']},
+        'category_path': {'only': ['category']},
+        'stock_quantity': {'only': ['stock_quantity', 'stock_stripes']},
+    }
+    # Row rendering expects querysets from Product.objects.with_available_stock()
+    values_fields = {
+        'category_name': (['category_id'], 'category_name_from_row'),
+        'category_path': (['category_id'], 'category_path_from_row'),
+        'stock_quantity': (['available_stock'], 'stock_from_row'),
+    }
 
     class Meta:
         model = Product
@@ -35,6 +80,52 @@ class ProductSerializer(serializers.ModelSerializer):
             'stock_quantity', 'is_active'
         ]
 
+    def update(self, instance, validated_data):
+        stock = validated_data.pop('stock_quantity', None) if instance.stock_stripes else None
+        # Write only the fields the client sent; a full save would put back the
+        # stock_quantity read before any concurrent decrement
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        if stock is not None:
+            instance.set_stock_stripes(instance.stock_stripes, total=stock)
+        return instance
+
+    def stock_from_row(self, row):
+        return row['available_stock']
+
+    def category_name_from_row(self, row):
+        node = get_context_tree(self.context).get(row['category_id'])
+        return node.name if node else Category.objects.get(pk=row['category_id']).name
+
+    def category_path_from_row(self, row):
+        tree = get_context_tree(self.context)
+        if row['category_id'] in tree:
+            return tree.get_path(row['category_id'])
+        return CategorySerializer(Category.objects.get(pk=row['category_id'])).data['path']
+
+    def get_category_detail(self, obj):
+        return {
+            'id': obj.category_id,
+            'name': self.get_category_name(obj),
+            'path': self.get_category_path(obj),
+        }
+
+    def get_category_name(self, obj):
+        node = get_context_tree(self.context).get(obj.category_id)
+        return node.name if node else obj.category.name
+
+    def get_category_path(self, obj):
+        tree = get_context_tree(self.context)
+        if obj.category_id in tree:
+            return tree.get_path(obj.category_id)
+        return CategorySerializer(obj.category).data['path']
+
+
+def split_category_path(path):
+    """Split a path like 'Bakery > Bread > Sourdough' into category names"""
+    return [name.strip() for name in path.split('>')]
+
 
 class ProductCreateSerializer(serializers.ModelSerializer):
     """Separate serializer for product creation to handle category paths"""
@@ -46,6 +137,12 @@ class ProductCreateSerializer(serializers.ModelSerializer):
             'name', 'description', 'price', 'category',
             'category_path', 'sku', 'stock_quantity', 'is_active'
         ]
+        extra_kwargs = {'category': {'required': False}}
+
+    def validate(self, attrs):
+        if not attrs.get('category') and not attrs.get('category_path'):
+            raise serializers.ValidationError({'category': ["This field is required."]})
+        return attrs
 
     def create(self, validated_data):
         category_path = validated_data.pop('category_path', None)
@@ -59,7 +156,7 @@ class ProductCreateSerializer(serializers.ModelSerializer):
 
     def _get_or_create_category_from_path(self, path):
         """Create category hierarchy from path like 'Bakery > Bread > Sourdough'"""
-        categories = [name.strip() for name in path.split('>')]
+        categories = split_category_path(path)
         parent = None
 
         for category_name in categories:
@@ -70,3 +167,16 @@ class ProductCreateSerializer(serializers.ModelSerializer):
             parent = category
 
         return parent
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    rows_per_second = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'status', 'format', 'bytes_received', 'rows_processed',
+            'rows_created', 'rows_failed', 'rows_per_second', 'errors',
+            'error_message', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
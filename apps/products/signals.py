@@ -0,0 +1,48 @@
+from decimal import Decimal
+
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.products.models import PRODUCTS_VERSION, Category, CategoryStats, Product
+from apps.products.search import install_search_index
+from apps.products.tree import invalidate_category_tree
+from utils.cache_versions import bump_version_on_commit
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    """
+    Invalidate the category snapshot in every worker
+    """
+    invalidate_category_tree()
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    """
+    Invalidate product collection validators and caches
+    """
+    bump_version_on_commit(PRODUCTS_VERSION)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    """
+    Remove a deleted product from its category rollups
+    """
+    bump_version_on_commit(PRODUCTS_VERSION)
+    if instance.is_active:
+        CategoryStats.add_products(instance.category_id, -1, -Decimal(instance.price))
+
+
+def repair_search_index(sender, using, **kwargs):
+    """
+    SQLite rebuilds tables on most schema changes, dropping the FTS triggers
+    with the old table, so reinstall them after every migrate
+    """
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        with connection.schema_editor() as schema_editor:
+            install_search_index(schema_editor)
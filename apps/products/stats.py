@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from apps.products.models import Category, CategoryStats, Product, path_ids
+
+STAT_FIELDS = ['product_count', 'price_sum', 'subtree_product_count', 'subtree_price_sum']
+
+
+def compute_category_stats():
+    """Recompute every category rollup from the product table.
+
+    Returns:
+        dict: Category id to a dict of STAT_FIELDS values.
+    """
+    stats = {
+        pk: dict.fromkeys(STAT_FIELDS, 0)
+        for pk in Category.objects.values_list('id', flat=True)
+    }
+    paths = dict(Category.objects.values_list('id', 'tree_path'))
+
+    totals = (
+        Product.objects.filter(is_active=True)
+        .values('category_id')
+        .annotate(count=Count('id'), price_sum=Sum('price'))
+    )
+    for row in totals:
+        count, price_sum = row['count'], row['price_sum'] or Decimal('0')
+        stats[row['category_id']]['product_count'] = count
+        stats[row['category_id']]['price_sum'] = price_sum
+        for pk in path_ids(paths[row['category_id']]):
+            stats[pk]['subtree_product_count'] += count
+            stats[pk]['subtree_price_sum'] += price_sum
+
+    return stats
+
+
+@transaction.atomic
+def rebuild_category_stats(fix=True):
+    """Compare stored rollups with freshly computed ones and optionally repair them.
+
+    Args:
+        fix (bool): Write the computed values when they differ.
+
+    Returns:
+        list: Category ids whose stored rollups were missing or wrong.
+    """
+    # Lock the rollups first so product writes committing meanwhile either
+    # land in the aggregates below or apply their delta after we finish.
+    stored = {row.category_id: row for row in CategoryStats.objects.select_for_update()}
+    expected = compute_category_stats()
+
+    drifted, missing, changed = [], [], []
+    for pk, values in expected.items():
+        row = stored.get(pk)
+        if row is None:
+            drifted.append(pk)
+            missing.append(CategoryStats(category_id=pk, **values))
+        elif any(getattr(row, field) != values[field] for field in STAT_FIELDS):
+            drifted.append(pk)
+            for field in STAT_FIELDS:
+                setattr(row, field, values[field])
+            changed.append(row)
+
+    if fix:
+        CategoryStats.objects.bulk_create(missing, batch_size=1000)
+        CategoryStats.objects.bulk_update(changed, STAT_FIELDS, batch_size=1000)
+
+    return drifted
@@ -1,13 +1,32 @@
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import timedelta
 from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
 
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 
-
-from apps.products.models import Category, Product
+from apps.products.imports import MAX_ATTEMPTS, spool_upload
+from apps.products.models import Category, CategoryStats, ImportJob, Product, StockBucket
+from apps.products.serializers import ProductSerializer
+from apps.products.tree import get_category_tree
+from utils.cache_versions import check_shared_cache
+from utils.single_flight import get_or_build
 
 
 class CategoryModelTest(TestCase):
@@ -33,6 +52,125 @@ class CategoryModelTest(TestCase):
         self.assertIn(self.bakery, descendants)
         self.assertIn(self.bread, descendants)
 
+    def test_tree_lookups_are_single_queries(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(list(self.bread.get_ancestors()), [self.root, self.bakery])
+        with self.assertNumQueries(1):
+            self.assertEqual(list(self.root.get_descendants()), [self.bakery, self.bread])
+
+    def test_reparent_moves_subtree(self):
+        produce = Category.objects.create(name="Produce", parent=self.root)
+        self.bakery.parent = produce
+        self.bakery.save()
+
+        self.bread.refresh_from_db()
+        self.assertEqual(self.bread.tree_path, f"{self.root.pk}/{produce.pk}/{self.bakery.pk}/{self.bread.pk}/")
+        self.assertEqual(self.bread.level, 3)
+        self.assertEqual(list(self.bread.get_ancestors()), [self.root, produce, self.bakery])
+        self.assertIn(self.bread, produce.get_descendants())
+
+    def test_reparent_under_descendant_is_rejected(self):
+        self.root.parent = self.bread
+        with self.assertRaises(ValueError):
+            self.root.save()
+
+
+class CategoryTreeCacheTest(TestCase):
+    def setUp(self):
+        self.root = Category.objects.create(name="All Products")
+        self.bakery = Category.objects.create(name="Bakery", parent=self.root)
+        self.bread = Category.objects.create(name="Bread", parent=self.bakery)
+
+    def test_snapshot_contents(self):
+        tree = get_category_tree()
+        self.assertEqual(tree.get_path(self.bread.pk), "All Products > Bakery > Bread")
+        self.assertEqual(tree.get_by_slug('bakery').id, self.bakery.pk)
+        self.assertEqual(tree.get_descendant_ids(self.root.pk), {self.root.pk, self.bakery.pk, self.bread.pk})
+
+    def test_snapshot_is_reused_until_category_changes(self):
+        tree = get_category_tree()
+        with self.assertNumQueries(0):
+            self.assertIs(get_category_tree(), tree)
+
+        self.bread.name = "Breads"
+        self.bread.save()
+
+        tree = get_category_tree()
+        self.assertEqual(tree.get_path(self.bread.pk), "All Products > Bakery > Breads")
+
+    def test_snapshot_drops_deleted_categories(self):
+        get_category_tree()
+        self.bakery.delete()
+        self.assertNotIn(self.bread.pk, get_category_tree())
+
+    def test_deploy_check_rejects_process_local_cache(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+        with override_settings(DEBUG=False, CACHES=locmem):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['store.E001'])
+        with override_settings(DEBUG=False, CACHES=redis):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class CategoryStatsTest(TestCase):
+    def setUp(self):
+        self.root = Category.objects.create(name="All Products")
+        self.bakery = Category.objects.create(name="Bakery", parent=self.root)
+        self.bread = Category.objects.create(name="Bread", parent=self.bakery)
+        self.produce = Category.objects.create(name="Produce", parent=self.root)
+        self.product = Product.objects.create(
+            name="Sourdough", price=Decimal('6.00'), category=self.bread, sku="BREAD001"
+        )
+
+    def assertStats(self, category, product_count, price_sum, subtree_product_count, subtree_price_sum):
+        stats = CategoryStats.objects.get(category=category)
+        self.assertEqual(
+            (stats.product_count, stats.price_sum, stats.subtree_product_count, stats.subtree_price_sum),
+            (product_count, Decimal(price_sum), subtree_product_count, Decimal(subtree_price_sum))
+        )
+
+    def test_create_and_price_change(self):
+        self.assertStats(self.bread, 1, '6.00', 1, '6.00')
+        self.assertStats(self.root, 0, '0', 1, '6.00')
+
+        self.product.price = Decimal('4.50')
+        self.product.save()
+        self.assertStats(self.bread, 1, '4.50', 1, '4.50')
+        self.assertStats(self.root, 0, '0', 1, '4.50')
+
+    def test_recategorize_deactivate_and_delete(self):
+        self.product.category = self.produce
+        self.product.save()
+        self.assertStats(self.bread, 0, '0', 0, '0')
+        self.assertStats(self.bakery, 0, '0', 0, '0')
+        self.assertStats(self.produce, 1, '6.00', 1, '6.00')
+        self.assertStats(self.root, 0, '0', 1, '6.00')
+
+        self.product.is_active = False
+        self.product.save()
+        self.assertStats(self.produce, 0, '0', 0, '0')
+
+        self.product.is_active = True
+        self.product.save()
+        self.product.delete()
+        self.assertStats(self.produce, 0, '0', 0, '0')
+        self.assertStats(self.root, 0, '0', 0, '0')
+
+    def test_reparent_moves_subtree_totals(self):
+        self.bakery.parent = self.produce
+        self.bakery.save()
+        self.assertStats(self.produce, 0, '0', 1, '6.00')
+        self.assertStats(self.root, 0, '0', 1, '6.00')
+
+    def test_rebuild_command_repairs_drift(self):
+        CategoryStats.objects.filter(category=self.root).update(subtree_product_count=7)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_category_stats', '--verify', stdout=StringIO())
+        call_command('rebuild_category_stats', stdout=StringIO())
+        call_command('rebuild_category_stats', '--verify', stdout=StringIO())
+        self.assertStats(self.root, 0, '0', 1, '6.00')
+
 
 class ProductModelTest(TestCase):
     def setUp(self):
@@ -51,6 +189,16 @@ class ProductModelTest(TestCase):
         self.assertEqual(self.product.category, self.category)
         self.assertTrue(self.product.is_active)
 
+    def test_update_keeps_concurrent_stock_change(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        Product.decrement_stock({self.product.pk: 3})
+
+        serializer = ProductSerializer(stale, data={'name': "Renamed"}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.stock_quantity), ("Renamed", 97))
+
 
 class CategoryAPITest(APITestCase):
     def setUp(self):
@@ -143,4 +291,495 @@ class ProductAPITest(APITestCase):
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['total_created'], 2)
-        self.assertEqual(Product.objects.count(), 2)
\ No newline at end of file
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_bulk_upload_batches_queries_and_reports_errors(self):
+        Product.objects.create(
+            name='Existing', price='1.00', category=self.category, sku='PROD000', stock_quantity=1
+        )
+        url = reverse('product-bulk-upload')
+        data = [
+            {'name': 'Existing again', 'price': '1.00', 'category': self.category.pk, 'sku': 'PROD000'},
+            {'name': 'Duplicate in feed', 'price': '1.00', 'category_path': 'Bakery > Bread', 'sku': 'PROD003'},
+            {'name': 'Missing category', 'price': '1.00', 'category': 999999, 'sku': 'PROD004'},
+            {'name': 'No price', 'category': self.category.pk, 'sku': 'PROD005'},
+        ] + [
+            {'name': f'Loaf {i}', 'price': '2.50', 'category_path': 'Bakery > Bread', 'sku': f'BREAD{i:03}'}
+            for i in range(20)
+        ] + [
+            {'name': 'Duplicate in feed', 'price': '1.00', 'category_path': 'Bakery > Bread', 'sku': 'PROD003'},
+        ]
+
+        response = self.client.post(f'{url}?batch_size=50', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_created'], 21)
+        self.assertEqual(response.data['total_errors'], 4)
+        self.assertEqual(
+            [(error['row'], error['product_data']['sku']) for error in response.data['errors']],
+            [(1, 'PROD000'), (3, 'PROD004'), (4, 'PROD005'), (25, 'PROD003')]
+        )
+        self.assertIn('sku', response.data['errors'][0]['errors'])
+
+        bread = Category.objects.get(name='Bread', parent__name='Bakery')
+        self.assertEqual(Product.objects.filter(category=bread).count(), 21)
+        self.assertEqual(CategoryStats.objects.get(category=bread.parent).subtree_product_count, 21)
+
+        more = [
+            {'name': f'Roll {i}', 'price': '1.00', 'category_path': 'Bakery > Bread', 'sku': f'ROLL{i:03}'}
+            for i in range(40)
+        ]
+        with CaptureQueriesContext(connection) as small_batch:
+            self.client.post(url, more[:20], format='json')
+        with CaptureQueriesContext(connection) as large_batch:
+            self.client.post(url, more[20:] + more[20:], format='json')
+        self.assertEqual(len(small_batch), len(large_batch))
+
+
+class ImportJobAPITest(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(
+            username="importer",
+            email="importer@example.com",
+            password='testpassword'
+        )
+        self.client.force_authenticate(user=user)
+        self.category = Category.objects.create(name="Test Category")
+
+    def upload(self, body, content_type):
+        response = self.client.post(reverse('import-list'), body, content_type=content_type)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'pending')
+        call_command('process_imports', '--once', stdout=StringIO())
+        return self.client.get(reverse('import-detail', kwargs={'pk': response.data['id']}))
+
+    def test_ndjson_import(self):
+        body = "\n".join([
+            f'{{"name": "Product 1", "price": "10.99", "category": {self.category.pk}, "sku": "NDJ001"}}',
+            '{"name": "Product 2", "price": "5.00", "category_path": "Bakery > Bread", "sku": "NDJ002"}',
+            'not json',
+            '{"name": "No price", "sku": "NDJ003", "category_path": "Bakery"}',
+        ])
+
+        response = self.upload(body, 'application/x-ndjson')
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(response.data['rows_processed'], 4)
+        self.assertEqual(response.data['rows_created'], 2)
+        self.assertEqual(response.data['rows_failed'], 2)
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 4])
+        self.assertTrue(Product.objects.filter(sku='NDJ002', category__name='Bread').exists())
+
+    def test_csv_import(self):
+        body = (
+            "name,price,category,category_path,sku,stock_quantity\n"
+            f"Product 1,10.99,{self.category.pk},,CSV001,3\n"
+            "Product 2,4.00,,Bakery > Bread,CSV002,\n"
+        )
+
+        response = self.upload(body, 'text/csv')
+        self.assertEqual(response.data['rows_created'], 2)
+        self.assertEqual(Product.objects.get(sku='CSV001').stock_quantity, 3)
+        self.assertFalse(ImportJob.objects.filter(status='pending').exists())
+
+    def spool(self, skus):
+        body = "\n".join(
+            f'{{"name": "{sku}", "price": "1.00", "category": {self.category.pk}, "sku": "{sku}"}}' for sku in skus
+        )
+        return spool_upload(BytesIO(body.encode()), 'ndjson')
+
+    def test_job_of_dead_worker_resumes_after_last_batch(self):
+        job = self.spool(['RES001', 'RES002', 'RES003'])
+        ImportJob.objects.filter(pk=job.pk).update(
+            status='running', attempts=1, rows_processed=1, rows_created=1,
+            lease_expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        call_command('process_imports', '--once', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.rows_processed, job.rows_created), ('completed', 2, 3, 3))
+        self.assertEqual(sorted(Product.objects.values_list('sku', flat=True)), ['RES002', 'RES003'])
+        self.assertFalse(os.path.exists(job.source_path))
+
+    def test_running_job_with_live_lease_is_not_claimed(self):
+        job = self.spool(['LIVE001'])
+        ImportJob.objects.filter(pk=job.pk).update(
+            status='running', attempts=1, lease_expires_at=timezone.now() + timedelta(minutes=5)
+        )
+        call_command('process_imports', '--once', stdout=StringIO())
+        self.assertEqual(ImportJob.objects.get(pk=job.pk).rows_processed, 0)
+
+    def test_failed_job_removes_spool(self):
+        crashing = self.spool(['FAIL001'])
+        err = StringIO()
+        with patch('apps.products.bulk.BulkProductImporter.import_batch', side_effect=RuntimeError("disk full")):
+            call_command('process_imports', '--once', stdout=StringIO(), stderr=err)
+        crashing.refresh_from_db()
+        self.assertEqual((crashing.status, crashing.error_message), ('failed', 'disk full'))
+        self.assertIn("disk full", err.getvalue())
+        self.assertFalse(os.path.exists(crashing.source_path))
+
+        abandoned = self.spool(['FAIL002'])
+        ImportJob.objects.filter(pk=abandoned.pk).update(
+            status='running', attempts=MAX_ATTEMPTS, lease_expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        call_command('process_imports', '--once', stdout=StringIO())
+        abandoned.refresh_from_db()
+        self.assertEqual(abandoned.status, 'failed')
+        self.assertFalse(os.path.exists(abandoned.source_path))
+        self.assertFalse(Product.objects.exists())
+
+    def test_unsupported_content_type(self):
+        response = self.client.post(reverse('import-list'), {'name': 'x'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+
+class ProductPaginationTest(APITestCase):
+    def setUp(self):
+        self.bakery = Category.objects.create(name="Bakery")
+        self.produce = Category.objects.create(name="Produce")
+        self.products = [
+            Product.objects.create(
+                name=f"Product {i}", price='1.00', sku=f"PAGE{i:03}",
+                category=self.bakery if i % 2 else self.produce
+            )
+            for i in range(7)
+        ]
+
+    def walk(self, url):
+        ids, previous = [], None
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(product['id'] for product in response.data['results'])
+            previous, url = response.data['previous'], response.data['next']
+        return ids, previous
+
+    def test_cursor_pagination_by_id(self):
+        ids, previous = self.walk(f"{reverse('product-list')}?pagination=cursor&page_size=3")
+        self.assertEqual(ids, [product.id for product in self.products])
+
+        response = self.client.get(previous)
+        self.assertEqual([product['id'] for product in response.data['results']], ids[3:6])
+
+    def test_cursor_pagination_by_category(self):
+        ids, _ = self.walk(f"{reverse('product-list')}?pagination=cursor&ordering=category&page_size=2")
+        expected = sorted(self.products, key=lambda product: (product.category_id, product.id))
+        self.assertEqual(ids, [product.id for product in expected])
+
+    def test_cursor_pagination_count_on_request(self):
+        response = self.client.get(f"{reverse('product-list')}?pagination=cursor&count=exact")
+        self.assertEqual(response.data['count'], 7)
+        self.assertFalse(response.data['count_is_estimate'])
+
+        response = self.client.get(f"{reverse('product-list')}?count=estimate")
+        self.assertEqual(response.data['count'], 7)
+        self.assertTrue(response.data['count_is_estimate'])
+
+    def test_cursor_pagination_rejects_search(self):
+        response = self.client.get(reverse('product-list'), {'pagination': 'cursor', 'search': 'product'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pagination', response.data)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f"{reverse('product-list')}?pagination=cursor&cursor=garbage")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ProductSearchTest(APITestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Electronics")
+        self.laptop = Product.objects.create(
+            name="Gaming Laptop", description="Fast laptop with a backlit keyboard",
+            price='999.99', category=category, sku="ELEC-LAP-001"
+        )
+        self.keyboard = Product.objects.create(
+            name="Mechanical Keyboard", description="Clicky switches",
+            price='79.99', category=category, sku="KBD-2000"
+        )
+
+    def search(self, query):
+        response = self.client.get(reverse('product-list'), {'search': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [product['id'] for product in response.data['results']]
+
+    def test_search_name_description_and_sku(self):
+        self.assertEqual(self.search('laptop'), [self.laptop.id])
+        self.assertEqual(self.search('KBD-2000'), [self.keyboard.id])
+        self.assertEqual(set(self.search('keyboard')), {self.laptop.id, self.keyboard.id})
+        self.assertEqual(self.search('"unbalanced'), [])
+
+    def test_search_ranks_name_matches_first(self):
+        self.assertEqual(self.search('keyboard')[0], self.keyboard.id)
+
+    def test_search_index_follows_updates(self):
+        self.laptop.name = "Ultrabook"
+        self.laptop.save()
+        self.assertEqual(self.search('ultrabook'), [self.laptop.id])
+        self.laptop.delete()
+        self.assertEqual(self.search('ultrabook'), [])
+
+
+class ProductFacetTest(APITestCase):
+    def setUp(self):
+        self.bakery = Category.objects.create(name="Bakery")
+        self.bread = Category.objects.create(name="Bread", parent=self.bakery)
+        self.produce = Category.objects.create(name="Produce")
+        Product.objects.create(name="Baguette", price='3.00', category=self.bread, sku="F001", stock_quantity=5)
+        Product.objects.create(name="Cake", price='30.00', category=self.bakery, sku="F002", stock_quantity=0)
+        Product.objects.create(name="Apples", price='12.00', category=self.produce, sku="F003", stock_quantity=9)
+
+    def get(self, **params):
+        response = self.client.get(reverse('product-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_filters(self):
+        def names(response):
+            return sorted(product['name'] for product in response.data['results'])
+
+        self.assertEqual(names(self.get(min_price='10', max_price='20')), ['Apples'])
+        self.assertEqual(names(self.get(in_stock='true')), ['Apples', 'Baguette'])
+        self.assertEqual(names(self.get(category=f'{self.bread.pk},{self.produce.pk}')), ['Apples', 'Baguette'])
+        self.assertEqual(self.client.get(reverse('product-list'), {'min_price': 'cheap'}).status_code, 400)
+
+    def test_facet_counts_in_one_query(self):
+        url = f"{reverse('product-list')}?facets=true&in_stock=true"
+        get_category_tree()
+        with self.assertNumQueries(3):  # page count, page rows, facets
+            response = self.client.get(url)
+
+        facets = response.data['facets']
+        self.assertEqual(
+            {facet['name']: facet['count'] for facet in facets['categories']},
+            {'Bakery': 1, 'Produce': 1}
+        )
+        self.assertEqual([bucket['count'] for bucket in facets['price'][:3]], [1, 1, 0])
+        self.assertEqual(facets['in_stock'], {'true': 2, 'false': 0})
+        self.assertNotIn('facets', self.get().data)
+
+
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        self.bakery = Category.objects.create(name="Bakery")
+        self.bread = Product.objects.create(name="Bread", price='2.50', category=self.bakery, sku="C001")
+
+    def test_unchanged_collection_returns_304_without_queries(self):
+        url = reverse('product-list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_change_invalidates_collection_and_resource(self):
+        list_etag = self.client.get(reverse('product-list'))['ETag']
+        detail_url = reverse('product-detail', kwargs={'pk': self.bread.pk})
+        detail_etag = self.client.get(detail_url)['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.bread.price = '3.00'
+        self.bread.save()
+        self.assertEqual(self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+        self.assertEqual(self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag).status_code, 200)
+
+    def test_striped_stock_change_invalidates_resource(self):
+        self.bread.set_stock_stripes(2, total=10)
+        detail_url = reverse('product-detail', kwargs={'pk': self.bread.pk})
+        response = self.client.get(detail_url)
+        # updated_at does not follow bucket changes, so it cannot validate
+        self.assertNotIn('Last-Modified', response)
+
+        StockBucket.take(self.bread.pk, 3)
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['stock_quantity'], 7)
+
+    def test_category_rename_invalidates_category_list(self):
+        url = reverse('category-list')
+        etag = self.client.get(url)['ETag']
+        self.bakery.name = "Bakery & Pastry"
+        self.bakery.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['name'], "Bakery & Pastry")
+
+
+@override_settings(CATALOG_RESPONSE_CACHE_TIMEOUT=60)
+class CatalogResponseCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.bakery = Category.objects.create(name="Bakery")
+        self.bread = Product.objects.create(name="Bread", price='2.50', category=self.bakery, sku="R001")
+
+    def test_list_served_from_cache_until_products_change(self):
+        url = f"{reverse('product-list')}?category={self.bakery.pk}"
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual(cached.json(), first.json())
+
+        self.bread.name = "Sourdough"
+        self.bread.save()
+        self.assertEqual(self.client.get(url).data['results'][0]['name'], "Sourdough")
+
+    def test_concurrent_misses_build_once(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'value'
+
+        threads = [threading.Thread(target=get_or_build, args=('single-flight-test', build, 60)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.get('single-flight-test'), 'value')
+
+    def test_slow_build_keeps_lock_of_next_builder(self):
+        def build():
+            # The lock expired mid-build and another builder took it
+            cache.set('slow-build:building', 'other-builder')
+            return 'value'
+
+        get_or_build('slow-build', build, 60)
+        self.assertEqual(cache.get('slow-build:building'), 'other-builder')
+
+
+class ProductFieldsetTest(APITestCase):
+    def setUp(self):
+        self.bakery = Category.objects.create(name="Bakery")
+        Product.objects.create(name="Bread", description="Crusty", price='2.50', category=self.bakery, sku="S001")
+
+    def test_fields_limit_output_and_loaded_columns(self):
+        get_category_tree()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('product-list'), {'fields': 'id,name,price'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'price'})
+        self.assertNotIn('description', queries[-1]['sql'])
+
+    def test_expand_category(self):
+        response = self.client.get(reverse('product-list'), {'fields': 'id,category', 'expand': 'category'})
+        self.assertEqual(
+            response.data['results'][0]['category'],
+            {'id': self.bakery.pk, 'name': "Bakery", 'path': "Bakery"}
+        )
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse('product-list'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FastListSerializationTest(APITestCase):
+    def setUp(self):
+        bakery = Category.objects.create(name="Bakery")
+        bread = Category.objects.create(name="Bread", parent=bakery)
+        Product.objects.create(name="Rye", description=None, price='3.5', category=bread, sku="V001")
+        Product.objects.create(name="Cake", description="Sweet", price='12.00', category=bakery, sku="V002")
+
+    def test_values_rows_match_model_serializer(self):
+        response = self.client.get(reverse('product-list'))
+        expected = ProductSerializer(Product.objects.order_by('id'), many=True).data
+        self.assertEqual(response.content, JSONRenderer().render({
+            'count': 2, 'next': None, 'previous': None, 'results': expected
+        }))
+
+
+class ProductExportTest(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username="exporter", is_staff=True))
+        bakery = Category.objects.create(name="Bakery")
+        self.bread = Category.objects.create(name="Bread", parent=bakery)
+        produce = Category.objects.create(name="Produce")
+        Product.objects.create(name="Rye", price='3.50', category=self.bread, sku="X001")
+        Product.objects.create(name="Apples", price='1.20', category=produce, sku="X002")
+
+    def read(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_csv_export_filtered_by_category(self):
+        response = self.client.get(reverse('product-export', kwargs={'file_format': 'csv'}), {'category': self.bread.pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = self.read(response).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'sku', 'name'])
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].endswith('Bakery > Bread'))
+
+    def test_gzipped_ndjson_export(self):
+        response = self.client.get(reverse('product-export', kwargs={'file_format': 'ndjson'}), {'gzip': 'true'})
+        self.assertIn('products.ndjson.gz', response['Content-Disposition'])
+        rows = [json.loads(line) for line in gzip.decompress(self.read(response)).splitlines()]
+        self.assertEqual([row['sku'] for row in rows], ['X001', 'X002'])
+        self.assertEqual(rows[0]['price'], '3.50')
+
+    def test_export_requires_staff(self):
+        self.client.force_authenticate(User.objects.create_user(username="shopper"))
+        response = self.client.get(reverse('product-export', kwargs={'file_format': 'csv'}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class StripedStockTest(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create_user(username="buyer"))
+        category = Category.objects.create(name="Hot")
+        self.product = Product.objects.create(
+            name="Console", price='499.00', category=category, sku="HOT001", stock_quantity=10
+        )
+        self.product.set_stock_stripes(4)
+
+    def test_stock_is_spread_over_buckets(self):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 0)
+        self.assertEqual(
+            list(StockBucket.objects.filter(product=self.product).order_by('stripe').values_list('quantity', flat=True)),
+            [3, 3, 2, 2]
+        )
+        self.assertEqual(self.product.get_available_stock(), 10)
+
+    def test_api_reports_summed_stock(self):
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.data['results'][0]['stock_quantity'], 10)
+        response = self.client.get(reverse('product-detail', kwargs={'pk': self.product.pk}))
+        self.assertEqual(response.data['stock_quantity'], 10)
+
+    def test_decrement_takes_from_buckets(self):
+        self.assertEqual(Product.decrement_stock({self.product.pk: 3}), {})
+        self.assertEqual(Product.decrement_stock({self.product.pk: 6}), {})
+        self.assertEqual(Product.objects.with_available_stock().get(pk=self.product.pk).available_stock, 1)
+        self.assertEqual(Product.decrement_stock({self.product.pk: 2}), {self.product.pk: 1})
+
+        Product.increment_stock({self.product.pk: 4})
+        self.assertEqual(Product.objects.with_available_stock().get(pk=self.product.pk).available_stock, 5)
+
+    def test_unstriping_folds_buckets_back(self):
+        Product.decrement_stock({self.product.pk: 4})
+        self.product.set_stock_stripes(0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 6)
+        self.assertFalse(StockBucket.objects.filter(product=self.product).exists())
+
+    def test_update_restripes_new_stock_level(self):
+        self.client.force_authenticate(User.objects.create_user(username="admin", is_staff=True))
+        response = self.client.patch(
+            reverse('product-detail', kwargs={'pk': self.product.pk}), {'stock_quantity': 20}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['stock_quantity'], 20)
+        self.assertEqual(StockBucket.objects.filter(product=self.product).count(), 4)
+
+    def test_set_stock_stripes_command(self):
+        out = StringIO()
+        call_command('set_stock_stripes', 'HOT001', '2', stdout=out)
+        self.assertIn('10 units over 2 stripe(s)', out.getvalue())
+        self.assertEqual(StockBucket.objects.filter(product=self.product).count(), 2)
+        with self.assertRaises(CommandError):
+            call_command('set_stock_stripes', 'NOPE', '2')
@@ -0,0 +1,116 @@
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from apps.products.models import Category
+from utils.cache_versions import bump_version_on_commit, get_version
+
+PATH_SEPARATOR = ' > '
+CATEGORY_TREE_VERSION = 'category_tree'
+
+CategoryNode = namedtuple('CategoryNode', ['id', 'name', 'slug', 'parent_id', 'tree_path', 'level'])
+
+
+class CategoryTree:
+    """Immutable in-memory snapshot of the category forest.
+
+    Built from a single query; paths and descendant id sets are computed
+    up front so lookups never touch the database.
+    """
+
+    def __init__(self, nodes, version=None):
+        self.version = version
+        nodes = sorted(nodes, key=lambda n: n.id)
+
+        by_id = {}
+        by_slug = {}
+        children = {}
+        for node in nodes:
+            by_id[node.id] = node
+            by_slug[node.slug] = node
+            children.setdefault(node.parent_id, []).append(node.id)
+
+        paths = {}
+        descendants = {node.id: {node.id} for node in nodes}
+        for node in sorted(nodes, key=lambda n: n.level):
+            parent_path = paths.get(node.parent_id)
+            paths[node.id] = f"{parent_path}{PATH_SEPARATOR}{node.name}" if parent_path else node.name
+            for ancestor_id in node.tree_path.split('/')[:-2]:
+                if ancestor_id and int(ancestor_id) in descendants:
+                    descendants[int(ancestor_id)].add(node.id)
+
+        self.nodes = MappingProxyType(by_id)
+        self.slugs = MappingProxyType(by_slug)
+        self.children = MappingProxyType({pk: tuple(ids) for pk, ids in children.items()})
+        self.paths = MappingProxyType(paths)
+        self.descendant_ids = MappingProxyType({pk: frozenset(ids) for pk, ids in descendants.items()})
+
+    @classmethod
+    def load(cls, version=None):
+        """Build the tree from one query over all categories"""
+        rows = Category.objects.values_list(*CategoryNode._fields)
+        return cls((CategoryNode(*row) for row in rows), version=version)
+
+    def __contains__(self, category_id):
+        return category_id in self.nodes
+
+    def get(self, category_id):
+        return self.nodes.get(category_id)
+
+    def get_by_slug(self, slug):
+        return self.slugs.get(slug)
+
+    def roots(self):
+        return [self.nodes[pk] for pk in self.children.get(None, ())]
+
+    def get_path(self, category_id):
+        """Return full category path like 'All Products > Bakery > Bread'"""
+        return self.paths[category_id]
+
+    def get_descendant_ids(self, category_id):
+        """Ids of a category and all of its descendants"""
+        return self.descendant_ids.get(category_id, frozenset())
+
+    def render(self, category_id):
+        """Serialize a node and its subtree in the CategorySerializer format"""
+        node = self.nodes[category_id]
+        return {
+            'id': node.id,
+            'name': node.name,
+            'parent': node.parent_id,
+            'children': self.render_children(category_id),
+            'path': self.paths[category_id],
+        }
+
+    def render_children(self, category_id):
+        return [self.render(pk) for pk in self.children.get(category_id, ())]
+
+
+_current_tree = None
+_rebuild_lock = threading.Lock()
+
+
+def get_category_tree():
+    """Return the process-local category snapshot, rebuilding it when stale.
+
+    Staleness is decided by a version counter in the Django cache, so every
+    worker sharing that cache rebuilds after a category changes.
+    """
+    global _current_tree
+
+    version = get_version(CATEGORY_TREE_VERSION)
+    tree = _current_tree
+    if tree is not None and tree.version == version:
+        return tree
+
+    with _rebuild_lock:
+        tree = _current_tree
+        if tree is None or tree.version != version:
+            tree = CategoryTree.load(version=version)
+            _current_tree = tree
+    return tree
+
+
+def invalidate_category_tree():
+    """Mark every worker's category snapshot as stale"""
+    bump_version_on_commit(CATEGORY_TREE_VERSION)
@@ -1,10 +1,11 @@
 from rest_framework.routers import DefaultRouter
 
-from apps.products.views import ProductViewSet, CategoryViewSet
+from apps.products.views import ProductViewSet, CategoryViewSet, ImportJobViewSet
 
 router = DefaultRouter()
 
 router.register(r'products', ProductViewSet, basename='product')
 router.register(r'categories', CategoryViewSet, basename='category')
+router.register(r'imports', ImportJobViewSet, basename='import')
 
 urlpatterns = router.urls
\ No newline at end of file
@@ -1,58 +1,90 @@
-from django.db.models import Avg
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 
-from apps.products.models import Product, Category
-from apps.products.serializers import ProductSerializer, ProductCreateSerializer, CategorySerializer
+from apps.products.bulk import BulkProductImporter
+from apps.products.facets import compute_facets, filter_products, parse_bool
+from apps.products.imports import CONTENT_TYPE_FORMATS, spool_upload
+from apps.products.models import PRODUCTS_VERSION, Product, Category, CategoryStats, ImportJob
+from apps.products.search import get_search_backend
+from apps.products.serializers import (
+    ProductSerializer, ProductCreateSerializer, CategorySerializer, ImportJobSerializer
+)
+from apps.products.tree import CATEGORY_TREE_VERSION, get_category_tree
+from utils.conditional import ConditionalGetMixin
+from utils.exports import export_queryset, iterate_rows, parse_datetime_param
+from utils.fast_serialization import FastListMixin
+from utils.fieldsets import SparseFieldsetViewMixin
+from utils.pagination import PageNumberPagination, ProductKeysetPagination, SelectablePaginationMixin
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+PRODUCT_EXPORT_COLUMNS = [
+    'id', 'sku', 'name', 'description', 'price', 'category_id', 'stock_quantity', 'is_active', 'updated_at'
+]
+
+
+class CategoryViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Category.objects.filter(parent=None).order_by('-id')
     serializer_class = CategorySerializer
     permission_classes = []
+    # Categories render their whole subtree, so any tree change invalidates them
+    collection_versions = (CATEGORY_TREE_VERSION,)
+    resource_versions = (CATEGORY_TREE_VERSION,)
+    vary_on_user = False
+    cache_responses = True
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['category_tree'] = get_category_tree()
+        return context
 
     @action(detail=False, methods=['get'])
     def all_categories(self, request):
         """Get all categories including nested ones"""
-        categories = Category.objects.all().order_by('-id')
-        serializer = self.get_serializer(categories, many=True)
-        return Response(serializer.data)
+        tree = get_category_tree()
+        return Response([tree.render(pk) for pk in sorted(tree.nodes, reverse=True)])
 
     @action(detail=True, methods=['get'], url_path='average-price')
     def average_price(self, request, pk=None):
         """Get average product price for a category and its subcategories"""
-        self.queryset = Category.objects.all()
         try:
-            category = self.get_object()
-            descendant_categories = category.get_descendants()
-            all_categories = [category] + descendant_categories
-
-            avg_price = Product.objects.filter(
-                category__in=all_categories,
-                is_active=True
-            ).aggregate(avg_price=Avg('price'))['avg_price']
-
-            return Response({
-                'category': category.name,
-                'category_path': ' > '.join([a.name for a in category.get_ancestors()] + [category.name]),
-                'average_price': round(avg_price, 2) if avg_price else 0,
-                'product_count': Product.objects.filter(
-                    category__in=all_categories,
-                    is_active=True
-                ).count()
-            }, status=status.HTTP_200_OK)
-
-        except Category.DoesNotExist:
+            stats = CategoryStats.objects.select_related('category').get(category_id=pk)
+        except (CategoryStats.DoesNotExist, ValueError):
             return Response(
                 {'error': 'Category not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        return Response({
+            'category': stats.category.name,
+            'category_path': get_category_tree().get_path(stats.category_id),
+            'average_price': stats.average_price,
+            'product_count': stats.subtree_product_count
+        }, status=status.HTTP_200_OK)
+
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(
+    ConditionalGetMixin, FastListMixin, SparseFieldsetViewMixin, SelectablePaginationMixin, viewsets.ModelViewSet
+):
     queryset = Product.objects.filter(is_active=True)
     permission_classes = []
+    # Keyset pagination reads the ordering columns from every row
+    always_load = ('id', 'category')
+    values_lookups = ('id', 'category_id')
+    collection_versions = (PRODUCTS_VERSION, CATEGORY_TREE_VERSION)
+    # category_name and category_path are read from the category tree
+    resource_versions = (CATEGORY_TREE_VERSION,)
+    # Striped stock changes never touch the product row's updated_at, so the
+    # ETag carries the stock and a Last-Modified from updated_at would be stale
+    resource_validator_fields = ('updated_at', 'available_stock')
+    resource_last_modified = False
+    vary_on_user = False
+    cache_responses = True
+    pagination_classes = {
+        'page': PageNumberPagination,
+        'cursor': ProductKeysetPagination,
+    }
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -60,37 +92,39 @@ class ProductViewSet(viewsets.ModelViewSet):
         return ProductSerializer
 
     def get_queryset(self):
-        queryset = Product.objects.filter(is_active=True)
-        category_id = self.request.query_params.get('category', None)
-
-        if category_id:
-            try:
-                category = Category.objects.get(id=category_id)
-                descendant_categories = category.get_descendants()
-                all_categories = [category] + descendant_categories
-                queryset = queryset.filter(category__in=all_categories)
-            except Category.DoesNotExist:
-                pass
+        queryset = Product.objects.with_available_stock().filter(is_active=True).order_by('id')
+        queryset = filter_products(queryset, self.request.query_params)
+
+        search = self.request.query_params.get('search')
+        if search:
+            queryset = get_search_backend().search(queryset, search)
 
         return queryset
 
+    def paginate_queryset(self, queryset):
+        self.unpaginated_queryset = queryset
+        return super().paginate_queryset(queryset)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if parse_bool(self.request.query_params, 'facets'):
+            response.data['facets'] = compute_facets(self.unpaginated_queryset)
+        return response
+
     @action(detail=False, methods=['post'])
     def bulk_upload(self, request):
         """Bulk upload products"""
         products_data = request.data if isinstance(request.data, list) else [request.data]
-        created_products = []
-        errors = []
-
-        for product_data in products_data:
-            serializer = ProductCreateSerializer(data=product_data)
-            if serializer.is_valid():
-                product = serializer.save()
-                created_products.append(ProductSerializer(product).data)
-            else:
-                errors.append({
-                    'product_data': product_data,
-                    'errors': serializer.errors
-                })
+        batch_size = request.query_params.get('batch_size')
+        if batch_size is not None and not (batch_size.isdigit() and int(batch_size) > 0):
+            return Response(
+                {'error': 'batch_size must be a positive integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        importer = BulkProductImporter(batch_size=int(batch_size) if batch_size else None)
+        products, errors = importer.run(products_data)
+        created_products = ProductSerializer(products, many=True).data
 
         return Response({
             'created': created_products,
@@ -99,3 +133,53 @@ class ProductViewSet(viewsets.ModelViewSet):
             'total_errors': len(errors)
         })
 
+    @action(detail=False, methods=['get'], url_path=r'export/(?P<file_format>csv|ndjson)',
+            permission_classes=[IsAdminUser])
+    def export(self, request, file_format):
+        """Stream the catalog as CSV or NDJSON, optionally gzipped"""
+        params = request.query_params
+        queryset = filter_products(Product.objects.all(), params)
+        is_active = parse_bool(params, 'is_active')
+        if is_active is not None:
+            queryset = queryset.filter(is_active=is_active)
+        updated_since = parse_datetime_param(params, 'updated_since')
+        if updated_since:
+            queryset = queryset.filter(updated_at__gte=updated_since)
+        updated_before = parse_datetime_param(params, 'updated_before')
+        if updated_before:
+            queryset = queryset.filter(updated_at__lt=updated_before)
+
+        tree = get_category_tree()
+        columns = PRODUCT_EXPORT_COLUMNS + ['category_path']
+        lookups = [column for column in PRODUCT_EXPORT_COLUMNS if column != 'stock_quantity']
+        rows = queryset.with_available_stock().order_by('id').values(*lookups, 'available_stock')
+
+        def with_paths(rows):
+            for row in rows:
+                row['stock_quantity'] = row['available_stock']
+                row['category_path'] = tree.paths.get(row['category_id'], '')
+                yield row
+
+        return export_queryset(
+            with_paths(iterate_rows(rows)), columns, 'products', file_format, bool(parse_bool(params, 'gzip'))
+        )
+
+
+class ImportJobViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    queryset = ImportJob.objects.all()
+    serializer_class = ImportJobSerializer
+
+    def create(self, request, *args, **kwargs):
+        """Stream an NDJSON or CSV catalog feed to disk and import it in the background"""
+        content_type = request.content_type.split(';')[0].strip().lower()
+        import_format = CONTENT_TYPE_FORMATS.get(content_type)
+        if import_format is None:
+            return Response(
+                {'error': f"Unsupported content type. Use one of: {', '.join(CONTENT_TYPE_FORMATS)}"},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+
+        # The process_imports worker picks the pending job up
+        job = spool_upload(request.stream, import_format)
+
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
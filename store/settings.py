@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 
@@ -35,6 +36,7 @@ INSTALLED_APPS = [
 
     'apps.authentication',
     'apps.customers',
+    'apps.notifications',
     'apps.orders',
     'apps.products',
 ]
@@ -62,7 +64,7 @@ REST_FRAMEWORK = {
     # 'DEFAULT_RENDERER_CLASSES': [
     #     'rest_framework.renderers.JSONRenderer',
     # ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'utils.pagination.PageNumberPagination',
     'PAGE_SIZE': 20
 }
 
@@ -123,6 +125,13 @@ DATABASES = {
     }
 }
 
+# Use a shared backend (e.g. redis://host:6379/1) in production so every
+# worker sees the same cache version counters; `check --deploy` rejects
+# the local memory default when DEBUG is off.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -153,12 +162,57 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Rows validated and inserted per batch by the product bulk upload
+PRODUCT_BULK_UPLOAD_BATCH_SIZE = env.int('PRODUCT_BULK_UPLOAD_BATCH_SIZE', default=500)
+
+# Lower bounds of the price facet buckets; the last bucket is open ended
+PRODUCT_PRICE_FACET_BUCKETS = env.list('PRODUCT_PRICE_FACET_BUCKETS', cast=float, default=[0, 10, 25, 50, 100, 250, 500, 1000])
+
+# Dotted path to a product search backend class; empty picks one for the database
+PRODUCT_SEARCH_BACKEND = env('PRODUCT_SEARCH_BACKEND', default='')
+
+# Streamed catalog imports are spooled here until the process_imports worker runs them;
+# the web and worker processes must share this directory
+PRODUCT_IMPORT_DIR = env('PRODUCT_IMPORT_DIR', default=os.path.join(tempfile.gettempdir(), 'store-imports'))
+PRODUCT_IMPORT_MAX_STORED_ERRORS = env.int('PRODUCT_IMPORT_MAX_STORED_ERRORS', default=1000)
+
+# Seconds to cache product and category list/detail responses; 0 disables the cache
+CATALOG_RESPONSE_CACHE_TIMEOUT = env.int('CATALOG_RESPONSE_CACHE_TIMEOUT', default=0)
+
+# Rows fetched per round trip by the streaming exports (server-side cursor on PostgreSQL)
+EXPORT_CHUNK_SIZE = env.int('EXPORT_CHUNK_SIZE', default=2000)
+
+# Seconds a checkout stock reservation is held before the reaper returns it
+RESERVATION_TTL_SECONDS = env.int('RESERVATION_TTL_SECONDS', default=600)
+
+# Seconds a response stored under an Idempotency-Key is replayed to retries
+IDEMPOTENCY_KEY_TTL_SECONDS = env.int('IDEMPOTENCY_KEY_TTL_SECONDS', default=86400)
+# Seconds a duplicate request waits for the in-flight original before a 409
+IDEMPOTENCY_WAIT_SECONDS = env.int('IDEMPOTENCY_WAIT_SECONDS', default=10)
+
+# Deliveries tried per outbox notification before it is dead-lettered
+NOTIFICATION_MAX_ATTEMPTS = env.int('NOTIFICATION_MAX_ATTEMPTS', default=8)
+# First retry delay in seconds; doubles with each failed attempt
+NOTIFICATION_RETRY_SECONDS = env.int('NOTIFICATION_RETRY_SECONDS', default=30)
+# When set, new-order admin emails are batched into one digest sent after this many seconds...
+ADMIN_EMAIL_DIGEST_SECONDS = env.int('ADMIN_EMAIL_DIGEST_SECONDS', default=0)
+# ...or as soon as this many are waiting
+ADMIN_EMAIL_DIGEST_SIZE = env.int('ADMIN_EMAIL_DIGEST_SIZE', default=50)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 AFRICAS_TALKING_USERNAME = env('AFRICAS_TALKING_USERNAME')
 AFRICAS_TALKING_API_KEY = env('AFRICAS_TALKING_API_KEY')
 AFRICAS_TALKING_SENDER_ID = env('AFRICAS_TALKING_SENDER_ID')
+# SMS transport class; utils.send_sms.LocmemTransport records messages instead of sending
+SMS_TRANSPORT = env('SMS_TRANSPORT', default='utils.send_sms.AfricasTalkingTransport')
+# Pooled HTTP connections (and parallel API calls) to the SMS provider
+SMS_POOL_SIZE = env.int('SMS_POOL_SIZE', default=4)
+# Messages that may wait for the SMS gateway before senders block
+SMS_QUEUE_SIZE = env.int('SMS_QUEUE_SIZE', default=1000)
+# Milliseconds the gateway waits to coalesce identical texts into one API call
+SMS_COALESCE_MS = env.int('SMS_COALESCE_MS', default=20)
 
 EMAIL_BACKEND = env('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = env('EMAIL_HOST')
@@ -1,5 +1,9 @@
+from io import StringIO
+
 from django.contrib.auth.models import User
-from django.test import TransactionTestCase
+from django.core import mail
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
@@ -11,6 +15,7 @@ from apps.products.models import Product
 from apps.orders.models import Order
 from apps.orders.models import OrderItem
 from apps.customers.models import Customer
+from utils import send_sms
 
 
 class CategoryHierarchyIntegrationTest(APITestCase):
@@ -44,8 +49,9 @@ class CategoryHierarchyIntegrationTest(APITestCase):
         response = self.client.post(reverse('category-list'), fruits_data)
         fruits_id = response.data['id']
 
-        # Test hierarchy display
-        response = self.client.get(reverse('category-list'))
+        # Test hierarchy display: page count, page of roots and one tree load
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('category-list'))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         # Should show root categories with nested children
         root_category = next(cat for cat in response.data['results'] if cat['id'] == root_id)
@@ -54,8 +60,9 @@ class CategoryHierarchyIntegrationTest(APITestCase):
         bakery_child = next(child for child in root_category['children'] if child['name'] == 'Bakery')
         self.assertEqual(len(bakery_child['children']), 1)  # Bread
 
-        # Test category paths
-        response = self.client.get(reverse('category-all-categories'))
+        # Test category paths, served from the category snapshot built above
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('category-all-categories'))
         bread_category = next(cat for cat in response.data if cat['id'] == bread_id)
         self.assertEqual(bread_category['path'], 'All Products > Bakery > Bread')
 
@@ -70,11 +77,13 @@ class ProductCatalogIntegrationTest(APITestCase):
         self.produce = Category.objects.create(name="Produce", parent=self.root)
         self.fruits = Category.objects.create(name="Fruits", parent=self.produce)
 #
+@override_settings(SMS_TRANSPORT='utils.send_sms.LocmemTransport')
 class OrderWorkflowIntegrationTest(TransactionTestCase):
     """Test complete order workflows with transactions"""
 
     def setUp(self):
         self.client = APIClient()
+        send_sms.outbox.clear()
 
         user = User.objects.create_user(
             username="testuser2",
@@ -101,9 +110,10 @@ class OrderWorkflowIntegrationTest(TransactionTestCase):
             category=self.category, sku='ELEC-KEY-001', stock_quantity=25
         )
 
-    @patch('apps.orders.views.send_sms_notification')
-    @patch('apps.orders.views.send_admin_email')
-    def test_complete_order_workflow_with_notifications(self, mock_email, mock_sms):
+    def dispatch_notifications(self):
+        call_command('dispatch_notifications', '--once', stdout=StringIO())
+
+    def test_complete_order_workflow_with_notifications(self):
         """Test complete order creation workflow with notifications"""
         order_data = {
             'customer': self.customer.id,
@@ -137,9 +147,12 @@ class OrderWorkflowIntegrationTest(TransactionTestCase):
         self.assertEqual(self.product2.stock_quantity, 48)  # 50 - 2
         self.assertEqual(self.product3.stock_quantity, 24)  # 25 - 1
 
-        # Verify notifications were called
-        mock_sms.assert_called_once()
-        mock_email.assert_called_once()
+        # Notifications are queued with the order and sent by the worker
+        self.assertEqual(send_sms.outbox, [])
+        self.dispatch_notifications()
+        self.assertEqual(len(send_sms.outbox), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, f"New Order #{order_id}")
 
     def test_order_validation_insufficient_stock(self):
         """Test order validation with insufficient stock"""
@@ -175,8 +188,7 @@ class OrderWorkflowIntegrationTest(TransactionTestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('not available', str(response.data))
 
-    @patch('apps.orders.views.send_sms_notification')
-    def test_order_status_update_workflow(self, mock_sms):
+    def test_order_status_update_workflow(self):
         """Test order status update workflow"""
         order = Order.objects.create(
             customer=self.customer,
@@ -201,10 +213,11 @@ class OrderWorkflowIntegrationTest(TransactionTestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-        mock_sms.assert_called_once_with(
+        self.dispatch_notifications()
+        self.assertEqual(send_sms.outbox, [(
             self.customer.phone,
             f"Order #{order.id} status updated: Shipped"
-        )
+        )])
 
         # Test invalid status
         response = self.client.patch(
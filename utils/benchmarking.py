@@ -0,0 +1,22 @@
+import time
+
+
+def time_calls(run, repeat):
+    """Call run() repeat times.
+
+    Returns:
+        tuple: The timing of each call in milliseconds and the last call's result.
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, result
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of values"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
@@ -0,0 +1,116 @@
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.checks import Error, Tags, register
+from django.db import transaction
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Version counters must live in a cache every worker and command shares"""
+    if settings.DEBUG or settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        "The default cache is local to each process, so cache versions bumped by one worker "
+        "or management command are never seen by the others.",
+        hint="Set CACHE_URL to a shared cache, e.g. redis://host:6379/1.",
+        id='store.E001',
+    )]
+
+
+def _version_key(name):
+    return f"version:{name}"
+
+
+def _modified_key(name):
+    return f"version:{name}:modified"
+
+
+def _initial_version():
+    # Seed from the clock so a version lost by cache eviction or restart
+    # never repeats one a worker may still be holding.
+    return int(time.time() * 1000)
+
+
+def get_version(name):
+    """Return the current version counter for a named dataset.
+
+    Args:
+        name (str): The dataset name, e.g. 'category_tree'.
+
+    Returns:
+        int: The version shared by all workers through the Django cache.
+    """
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    """Invalidate a named dataset by incrementing its version counter.
+
+    Args:
+        name (str): The dataset name, e.g. 'category_tree'.
+
+    Returns:
+        int: The new version.
+    """
+    key = _version_key(name)
+    cache.set(_modified_key(name), time.time(), timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), timeout=None)
+        return cache.get(key)
+
+
+def bump_version_on_commit(name):
+    """Bump a version now and again once the current transaction commits.
+
+    The second bump stops workers that read the old rows mid-transaction
+    from caching them under the new version.
+
+    Args:
+        name (str): The dataset name, e.g. 'products'.
+    """
+    bump_version(name)
+    transaction.on_commit(lambda: bump_version(name))
+
+
+def get_versions(*names):
+    """Return the current versions for several datasets in one cache round trip.
+
+    Args:
+        *names (str): Dataset names.
+
+    Returns:
+        tuple: The versions, in the order given.
+    """
+    keys = [_version_key(name) for name in names]
+    found = cache.get_many(keys)
+    return tuple(found[key] if key in found else get_version(name) for key, name in zip(keys, names))
+
+
+def get_last_modified(*names):
+    """Return when any of the named datasets last changed.
+
+    Args:
+        *names (str): Dataset names.
+
+    Returns:
+        datetime: The latest change time, or None if none is recorded.
+    """
+    found = cache.get_many([_modified_key(name) for name in names])
+    if not found:
+        return None
+    return datetime.fromtimestamp(max(found.values()), tz=timezone.utc)
@@ -0,0 +1,102 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from utils.cache_versions import get_last_modified, get_versions
+from utils.single_flight import get_or_build
+
+
+class ConditionalGetMixin:
+    """Answer If-None-Match / If-Modified-Since on list and retrieve with 304.
+
+    Collection validators come from the dataset version counters named in
+    collection_versions, so a matching list request is answered from the
+    cache alone. Resource validators combine the row's updated_at, read with
+    a narrow values query, with the versions in resource_versions for data
+    rendered from other tables.
+
+    Views that set cache_responses also keep successful response bodies in
+    the Django cache under their validator for CATALOG_RESPONSE_CACHE_TIMEOUT
+    seconds, so a bump of any version they depend on invalidates them.
+    """
+    collection_versions = ()
+    resource_versions = ()
+    # Columns hashed into a resource's ETag; the first must be its modification time
+    resource_validator_fields = ('updated_at',)
+    # Send Last-Modified for resources; turn off when the ETag covers data updated_at misses
+    resource_last_modified = True
+    # Whether responses differ per user and must be validated and cached separately
+    vary_on_user = True
+    cache_responses = False
+
+    def list(self, request, *args, **kwargs):
+        versions = get_versions(*self.collection_versions)
+        etag = self._make_etag(request, versions)
+        last_modified = get_last_modified(*self.collection_versions)
+        return self._conditional(request, etag, last_modified, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = {self.lookup_field: kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        try:
+            validators = (
+                self.filter_queryset(self.get_queryset())
+                .prefetch_related(None)
+                .filter(**lookup)
+                .values_list(*self.resource_validator_fields)
+                .first()
+            )
+        except (TypeError, ValueError):
+            validators = None
+        if validators is None:
+            # Let the normal code path produce the 404
+            return super().retrieve(request, *args, **kwargs)
+
+        updated_at = validators[0]
+        versions = get_versions(*self.resource_versions)
+        etag = self._make_etag(request, versions, *validators)
+        last_modified = None
+        if self.resource_last_modified:
+            last_modified = max(filter(None, [updated_at, get_last_modified(*self.resource_versions)]))
+        return self._conditional(request, etag, last_modified, super().retrieve, *args, **kwargs)
+
+    def _make_etag(self, request, *parts):
+        # The host is part of the key because paginated bodies embed absolute links
+        user = request.user.pk if self.vary_on_user else None
+        payload = json.dumps(
+            [self.basename, self.action, request.accepted_media_type, request.get_host(), user,
+             sorted(request.query_params.lists()), *parts],
+            default=str,
+        )
+        return f'W/"{hashlib.md5(payload.encode()).hexdigest()}"'
+
+    def _conditional(self, request, etag, last_modified, handler, *args, **kwargs):
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is not None:
+            return response
+
+        timeout = settings.CATALOG_RESPONSE_CACHE_TIMEOUT if self.cache_responses else 0
+        if timeout:
+            response = self._cached_response(f"response:{etag}", timeout, handler, request, *args, **kwargs)
+        else:
+            response = handler(request, *args, **kwargs)
+        if 200 <= response.status_code < 300:
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def _cached_response(self, key, timeout, handler, request, *args, **kwargs):
+        built = None
+
+        def build():
+            nonlocal built
+            built = handler(request, *args, **kwargs)
+            return built.data if 200 <= built.status_code < 300 else None
+
+        data = get_or_build(key, build, timeout)
+        return built if built is not None else Response(data)
@@ -0,0 +1,109 @@
+import csv
+import io
+import zlib
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+# Rows are joined into chunks of roughly this many bytes before being sent
+BUFFER_SIZE = 64 * 1024
+
+
+def parse_datetime_param(params, name):
+    """Read an ISO date or datetime query parameter as an aware datetime; dates mean midnight"""
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            parsed = datetime.combine(day, time.min) if day else None
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: ["Use an ISO 8601 date or datetime."]})
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def csv_lines(header, rows):
+    """Yield CSV text for a header and an iterable of row sequences"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= BUFFER_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_lines(objects):
+    """Yield newline-delimited JSON for an iterable of dicts"""
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    chunk = []
+    size = 0
+    for obj in objects:
+        line = encoder.encode(obj) + '\n'
+        chunk.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    yield ''.join(chunk)
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(chunks, filename, export_format, compress=False):
+    """Wrap generated text chunks in a streaming file download"""
+    content_type = EXPORT_FORMATS[export_format]
+    filename = f"{filename}.{export_format}"
+    if compress:
+        chunks = gzip_chunks(chunks)
+        content_type = 'application/gzip'
+        filename += '.gz'
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def iterate_rows(queryset):
+    """Iterate a queryset in chunks; PostgreSQL uses a server-side cursor"""
+    return queryset.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def export_queryset(rows, columns, filename, export_format, compress=False):
+    """Stream values() rows as CSV or NDJSON.
+
+    Args:
+        rows (iterable): Dicts keyed by the names in columns.
+        columns (list): Output column names, in order.
+        filename (str): Download name without extension.
+        export_format (str): 'csv' or 'ndjson'.
+        compress (bool): Gzip the stream.
+    """
+    if export_format == 'csv':
+        chunks = csv_lines(columns, ([row[column] for column in columns] for row in rows))
+    else:
+        chunks = ndjson_lines({column: row[column] for column in columns} for row in rows)
+    return export_response(chunks, filename, export_format, compress)
@@ -0,0 +1,96 @@
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.response import Response
+
+
+class ValuesSerializerMixin:
+    """Serializer mixin that renders read-only lists straight from queryset.values() rows.
+
+    Each readable field is compiled once into a (lookups, converter) pair:
+    plain and dotted-source fields reuse the declared field's
+    to_representation, primary key relations pass the id through, and
+    anything else must be listed in values_fields as
+    (lookups, converter method name), the method taking the whole row.
+    The output matches to_representation() on model instances.
+    """
+    values_fields = {}
+
+    def can_render_values(self):
+        """Whether every readable field has a values() plan"""
+        return all(
+            name in self.values_fields or self._plain_source(field)
+            for name, field in self.fields.items() if not field.write_only
+        )
+
+    @staticmethod
+    def _plain_source(field):
+        if isinstance(field, serializers.BaseSerializer) or field.source == '*':
+            return False
+        return not any(part.startswith('_') for part in field.source.split('.'))
+
+    def compile_values_plan(self):
+        plan = []
+        lookups = []
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if name in self.values_fields:
+                field_lookups, method_name = self.values_fields[name]
+                plan.append((name, None, getattr(self, method_name)))
+                lookups.extend(field_lookups)
+                continue
+            if not self._plain_source(field):
+                raise ImproperlyConfigured(f"{type(self).__name__}.{name} needs a values_fields entry")
+            lookup = field.source.replace('.', '__')
+            if isinstance(field, serializers.PrimaryKeyRelatedField):
+                plan.append((name, lookup, None))
+            else:
+                plan.append((name, lookup, field.to_representation))
+            lookups.append(lookup)
+        return plan, list(dict.fromkeys(lookups))
+
+    def values_queryset(self, queryset, *extra_lookups):
+        """Narrow a queryset to the values() rows this serializer renders"""
+        _, lookups = self.compile_values_plan()
+        return queryset.values(*dict.fromkeys([*lookups, *extra_lookups]))
+
+    def prepare_values_rows(self, rows):
+        """Hook for batch lookups (e.g. nested lists) before rows are rendered"""
+
+    def represent_rows(self, rows):
+        rows = list(rows)
+        self.prepare_values_rows(rows)
+        plan, _ = self.compile_values_plan()
+        data = []
+        for row in rows:
+            item = {}
+            for name, lookup, convert in plan:
+                if lookup is None:
+                    item[name] = convert(row)
+                else:
+                    value = row[lookup]
+                    item[name] = value if value is None or convert is None else convert(value)
+            data.append(item)
+        return data
+
+
+class FastListMixin:
+    """View mixin serving list() from values() rows when the serializer supports it.
+
+    Only the columns and joins the serializer needs are selected, and no
+    model instances or per-row field lookups are created. Any extra
+    columns the paginator orders by are listed in values_lookups.
+    """
+    values_lookups = ('id',)
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer()
+        if not isinstance(serializer, ValuesSerializerMixin) or not serializer.can_render_values():
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = serializer.values_queryset(queryset, *self.values_lookups)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(serializer.represent_rows(rows))
+        return self.get_paginated_response(serializer.represent_rows(page))
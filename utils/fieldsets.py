@@ -0,0 +1,106 @@
+from rest_framework.exceptions import ValidationError
+
+FIELDS_QUERY_PARAM = 'fields'
+EXPAND_QUERY_PARAM = 'expand'
+
+
+def parse_field_list(params, name):
+    """Return the names in a comma separated query parameter, or None if it is absent"""
+    if name not in params:
+        return None
+    return [field.strip() for value in params.getlist(name) for field in value.split(',') if field.strip()]
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin that renders only the fields named in the context.
+
+    context['fields'] limits the output to those fields, and names listed in
+    context['expand'] are swapped for their expandable_fields definition.
+    Dropped fields are removed before serialization, so their method fields
+    and related lookups never run.
+    """
+    # Field name -> (field class, kwargs) used when the field is expanded
+    expandable_fields = {}
+    # Field name -> {'only': [...], 'select_related': [...], 'prefetch_related': [...]}
+    # describing what the queryset must load to render it. Fields not listed
+    # need only the model column of the same name.
+    field_requirements = {}
+    expanded_requirements = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in self.context.get('expand') or ():
+            if name in self.fields and name in self.expandable_fields:
+                field_class, field_kwargs = self.expandable_fields[name]
+                self.fields[name] = field_class(**field_kwargs)
+
+    @classmethod
+    def validate_fieldsets(cls, fields, expand):
+        """Raise a 400 for field or expansion names the serializer does not offer"""
+        available = list(cls().fields)
+        unknown = [name for name in fields or () if name not in available]
+        if unknown:
+            raise ValidationError({FIELDS_QUERY_PARAM: [f"Unknown field(s): {', '.join(unknown)}"]})
+        unknown = [name for name in expand or () if name not in cls.expandable_fields]
+        if unknown:
+            raise ValidationError({EXPAND_QUERY_PARAM: [f"Cannot expand: {', '.join(unknown)}"]})
+
+    @classmethod
+    def get_requirements(cls, fields, expand):
+        """Collect the columns and joins needed to render the given fields"""
+        only, select_related, prefetch_related = set(), set(), set()
+        for name in fields:
+            if name in (expand or ()) and name in cls.expanded_requirements:
+                requirements = cls.expanded_requirements[name]
+            else:
+                requirements = cls.field_requirements.get(name, {'only': [name]})
+            only.update(requirements.get('only', ()))
+            select_related.update(requirements.get('select_related', ()))
+            prefetch_related.update(requirements.get('prefetch_related', ()))
+        return only, select_related, prefetch_related
+
+
+class SparseFieldsetViewMixin:
+    """View mixin that reads ?fields= and ?expand= on reads and projects the queryset.
+
+    Only the columns and joins the requested fields need are loaded. The
+    fields in always_load are kept for pagination and lookups.
+    """
+    always_load = ('id',)
+
+    def get_fieldsets(self):
+        if not hasattr(self, '_fieldsets'):
+            self._fieldsets = (None, None)
+            serializer_class = self.get_serializer_class()
+            if self.request.method in ('GET', 'HEAD') and issubclass(serializer_class, SparseFieldsetMixin):
+                fields = parse_field_list(self.request.query_params, FIELDS_QUERY_PARAM)
+                expand = parse_field_list(self.request.query_params, EXPAND_QUERY_PARAM)
+                serializer_class.validate_fieldsets(fields, expand)
+                self._fieldsets = (fields, expand)
+        return self._fieldsets
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'], context['expand'] = self.get_fieldsets()
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields, expand = self.get_fieldsets()
+        if fields is None and not expand:
+            return queryset
+
+        serializer_class = self.get_serializer_class()
+        if fields is None:
+            fields = list(serializer_class().fields)
+        only, select_related, prefetch_related = serializer_class.get_requirements(fields, expand)
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset.only(*self.always_load, *only)
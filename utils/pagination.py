@@ -0,0 +1,220 @@
+import base64
+import json
+from functools import cached_property
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+COUNT_QUERY_PARAM = 'count'
+
+
+def estimate_count(queryset):
+    """Return the planner's row estimate for a queryset.
+
+    Falls back to an exact COUNT(*) on databases without a usable estimate.
+    """
+    queryset = queryset.order_by()
+    if connections[queryset.db].vendor == 'postgresql':
+        plan = json.loads(queryset.explain(format='json'))
+        return int(plan[0]['Plan']['Plan Rows'])
+    return queryset.count()
+
+
+def wants_estimated_count(request):
+    return request.query_params.get(COUNT_QUERY_PARAM) == 'estimate'
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
+
+
+class PageNumberPagination(pagination.PageNumberPagination):
+    """Page number pagination that can report an estimated total with ?count=estimate"""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_is_estimate = wants_estimated_count(request)
+        self.django_paginator_class = EstimatedCountPaginator if self.count_is_estimate else Paginator
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count_is_estimate:
+            response.data['count_is_estimate'] = True
+        return response
+
+
+class KeysetPagination(pagination.BasePagination):
+    """Cursor pagination on a stable, indexed, composite ordering.
+
+    Pages are fetched with a WHERE clause on the last seen key instead of
+    OFFSET, and no COUNT(*) runs unless the client asks for one with
+    ?count=exact or ?count=estimate.
+    """
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    # Named orderings; each must end in a unique field
+    orderings = {'id': ('id',)}
+    default_ordering = 'id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.orderings.get(
+            request.query_params.get(self.ordering_query_param), self.orderings[self.default_ordering]
+        )
+
+        self.count = None
+        count_mode = request.query_params.get(COUNT_QUERY_PARAM)
+        if count_mode == 'exact':
+            self.count = queryset.order_by().count()
+        elif count_mode == 'estimate':
+            self.count = estimate_count(queryset)
+
+        position, reverse = self.decode_cursor(request)
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(self._invert(field) for field in ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.first_key = self._key(results[0]) if results else None
+        self.last_key = self._key(results[-1]) if results else None
+        return results
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_paginated_response(self, data):
+        payload = {}
+        if self.count is not None:
+            payload['count'] = self.count
+            payload['count_is_estimate'] = wants_estimated_count(self.request)
+        payload.update({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+        return Response(payload)
+
+    def get_next_link(self):
+        if not self.has_next or self.last_key is None:
+            return None
+        return self.encode_cursor(self.last_key, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first_key is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.first_key, reverse=True)
+
+    def encode_cursor(self, key, reverse):
+        token = json.dumps({'k': key, 'r': int(reverse)}, separators=(',', ':'), default=str)
+        encoded = base64.urlsafe_b64encode(token.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            token = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            key, reverse = token['k'], bool(token['r'])
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise NotFound('Invalid cursor')
+        if not isinstance(key, list) or len(key) != len(self.ordering):
+            raise NotFound('Invalid cursor')
+        return key, reverse
+
+    def _key(self, obj):
+        if isinstance(obj, dict):
+            return [obj[field.lstrip('-')] for field in self.ordering]
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _after(ordering, position):
+        """Lexicographic 'strictly after position' filter for a composite ordering"""
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            term = Q(**{f'{name}__{lookup}': position[index]})
+            for previous, value in zip(ordering[:index], position[:index]):
+                term &= Q(**{previous.lstrip('-'): value})
+            condition |= term
+        return condition
+
+
+class ProductKeysetPagination(KeysetPagination):
+    orderings = {
+        'id': ('id',),
+        'category': ('category_id', 'id'),
+    }
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Search results are ordered by rank, which these keys would silently replace
+        if request.query_params.get('search'):
+            raise ValidationError({
+                'pagination': "Cursor pagination cannot be combined with search; use page pagination."
+            })
+        return super().paginate_queryset(queryset, request, view)
+
+
+class OrderKeysetPagination(KeysetPagination):
+    orderings = {'-id': ('-id',)}
+    default_ordering = '-id'
+
+
+class SelectablePaginationMixin:
+    """Let clients pick a paginator per request with ?pagination=<name>.
+
+    Requests carrying a cursor always use the 'cursor' paginator so
+    next/previous links keep working.
+    """
+    pagination_query_param = 'pagination'
+    pagination_classes = {'page': PageNumberPagination}
+    default_pagination = 'page'
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params if self.request else {}
+            name = params.get(self.pagination_query_param, self.default_pagination)
+            if 'cursor' in self.pagination_classes and params.get(KeysetPagination.cursor_query_param):
+                name = 'cursor'
+            paginator_class = self.pagination_classes.get(name, self.pagination_classes[self.default_pagination])
+            self._paginator = paginator_class() if paginator_class else None
+        return self._paginator
@@ -1,6 +1,6 @@
 from smtplib import SMTPException
 
-from django.core.mail import send_mail, BadHeaderError
+from django.core.mail import EmailMessage, get_connection, send_mail, BadHeaderError
 
 from store import settings
 
@@ -23,4 +23,51 @@ def send_admin_email(subject, email_body):
     except BadHeaderError:
         raise ValueError("Invalid header found")
     except SMTPException as e:
-        raise ValueError(f"SMTP error occurred: {e}")
\ No newline at end of file
+        raise ValueError(f"SMTP error occurred: {e}")
+
+
+def send_admin_emails(messages):
+    """Send several admin emails over one reused SMTP connection.
+
+    Args:
+        messages (list): (subject, body) pairs.
+
+    Returns:
+        list: None for each email sent, or the exception that stopped it.
+        Never raises; a connection that cannot be opened fails every email.
+    """
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        # Nothing was sent; the whole batch shares the error
+        return [e] * len(messages)
+
+    errors = []
+    try:
+        for subject, body in messages:
+            email = EmailMessage(
+                subject, body, settings.DEFAULT_FROM_EMAIL, [settings.ADMIN_EMAIL], connection=connection
+            )
+            try:
+                connection.send_messages([email])
+            except Exception as e:
+                errors.append(e)
+            else:
+                errors.append(None)
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+    return errors
+
+
+def send_admin_digest(messages):
+    """Send several admin notifications as one summary email.
+
+    Args:
+        messages (list): (subject, body) pairs, oldest first.
+    """
+    sections = [f"{subject}\n{'=' * len(subject)}\n{body.strip()}" for subject, body in messages]
+    send_admin_email(f"Order digest: {len(messages)} notification(s)", '\n\n'.join(sections))
@@ -1,26 +1,220 @@
-import africastalking
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 
-from store import settings
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+# Messages recorded by LocmemTransport, like django.core.mail.outbox
+outbox = []
+# Seconds to wait for the gateway before a synchronous send gives up
+SEND_TIMEOUT = 30
+# Country code assumed for numbers written in local (leading 0) form
+DEFAULT_COUNTRY_CODE = '254'
+
+
+class SMSError(Exception):
+    """A message was not accepted for a recipient"""
+
+
+def normalize_number(phone_number):
+    """E.164 form of a number, so '0712 345-678', '254712345678' and '+254712345678' compare equal"""
+    digits = ''.join(char for char in phone_number if char.isdigit())
+    if phone_number.strip().startswith('+'):
+        return f'+{digits}'
+    if digits.startswith('0'):
+        return f'+{DEFAULT_COUNTRY_CODE}{digits[1:]}'
+    return f'+{digits}'
+
+
+class AfricasTalkingTransport:
+    """Africa's Talking bulk messaging API over one pooled, keep-alive HTTP session.
+
+    The SDK posts with a new connection per call; this sends the same form
+    through a requests.Session so TLS connections are reused.
+    """
+    max_recipients = 100
+    timeout = (3.05, 10)
+
+    def __init__(self, pool_size=None):
+        pool_size = pool_size or settings.SMS_POOL_SIZE
+        self.username = settings.AFRICAS_TALKING_USERNAME
+        domain = 'sandbox.africastalking.com' if self.username == 'sandbox' else 'africastalking.com'
+        self.url = f"https://api.{domain}/version1/messaging"
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.headers.update({
+            'Accept': 'application/json',
+            'apiKey': settings.AFRICAS_TALKING_API_KEY,
+        })
+
+    def send(self, message, recipients):
+        """Send one text to several numbers in a single API call.
+
+        Returns:
+            list: The API's per-recipient result dicts ('number', 'status', ...).
+        """
+        data = {'username': self.username, 'to': ','.join(recipients), 'message': message, 'bulkSMSMode': 1}
+        if settings.AFRICAS_TALKING_SENDER_ID:
+            data['from'] = settings.AFRICAS_TALKING_SENDER_ID
+        response = self.session.post(self.url, data=data, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['SMSMessageData']['Recipients']
+
+    def close(self):
+        self.session.close()
+
+
+class LocmemTransport:
+    """Records messages in outbox instead of sending them; for tests and benchmarks.
+
+    latency simulates the round trip of one API call.
+    """
+    max_recipients = 100
+
+    def __init__(self, latency=0):
+        self.latency = latency
+        self.calls = 0
+
+    def send(self, message, recipients):
+        if self.latency:
+            time.sleep(self.latency)
+        self.calls += 1
+        outbox.extend((recipient, message) for recipient in recipients)
+        return [{'number': recipient, 'status': 'Success'} for recipient in recipients]
+
+    def close(self):
+        pass
+
+
+class SMSGateway:
+    """Long-lived SMS sender with a bounded queue and message coalescing.
+
+    submit() queues a message and returns a Future. A background thread
+    collects whatever is queued within the coalescing window, sends each
+    distinct text once with all its recipients (up to the transport's
+    max_recipients per call, calls running in parallel over the pool), and
+    resolves every Future with that recipient's result. submit() blocks
+    while the queue is full.
+    """
+
+    def __init__(self, transport, queue_size=1000, coalesce_seconds=0.02, workers=4):
+        self.transport = transport
+        self.coalesce_seconds = coalesce_seconds
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sms-send')
+        self._thread = threading.Thread(target=self._run, name='sms-gateway', daemon=True)
+        self._thread.start()
+
+    def submit(self, phone_number, message, timeout=SEND_TIMEOUT):
+        future = Future()
+        self._queue.put((phone_number, message, future), timeout=timeout)
+        return future
+
+    def send(self, phone_number, message, timeout=SEND_TIMEOUT):
+        """Send one SMS and wait for its result; raises SMSError if it was rejected"""
+        return self.submit(phone_number, message, timeout).result(timeout)
+
+    def close(self):
+        """Send what is queued, then stop the sender thread"""
+        self._queue.put(None)
+        self._thread.join()
+        self._executor.shutdown()
+        self.transport.close()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.coalesce_seconds
+            while batch[-1] is not None:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is None
+            self._dispatch([entry for entry in batch if entry is not None])
+            if stopping:
+                return
+
+    def _dispatch(self, batch):
+        by_message = defaultdict(list)
+        for phone_number, message, future in batch:
+            by_message[message].append((phone_number, future))
+        calls = []
+        for message, entries in by_message.items():
+            size = self.transport.max_recipients
+            for start in range(0, len(entries), size):
+                chunk = entries[start:start + size]
+                calls.append(self._executor.submit(self._send_chunk, message, chunk))
+        for call in calls:
+            call.result()
+
+    def _send_chunk(self, message, entries):
+        recipients = list(dict.fromkeys(phone_number for phone_number, _ in entries))
+        try:
+            results = {
+                normalize_number(result['number']): result
+                for result in self.transport.send(message, recipients)
+            }
+        except Exception as e:
+            for _, future in entries:
+                future.set_exception(e)
+            return
+        for phone_number, future in entries:
+            result = results.get(normalize_number(phone_number))
+            if result is None:
+                # The call was accepted, so retrying could send the text twice
+                future.set_result({'number': phone_number, 'status': 'Unknown'})
+            elif result.get('status') != 'Success':
+                future.set_exception(SMSError(f"{phone_number}: {result.get('status')}"))
+            else:
+                future.set_result(result)
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """The process-wide gateway, built on first use from SMS_TRANSPORT"""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = SMSGateway(
+                import_string(settings.SMS_TRANSPORT)(),
+                queue_size=settings.SMS_QUEUE_SIZE,
+                coalesce_seconds=settings.SMS_COALESCE_MS / 1000,
+                workers=settings.SMS_POOL_SIZE,
+            )
+        return _gateway
+
+
+@receiver(setting_changed)
+def reset_gateway(setting=None, **kwargs):
+    """Rebuild the gateway when a test overrides the SMS settings"""
+    global _gateway
+    if setting is not None and not setting.startswith('SMS_'):
+        return
+    with _gateway_lock:
+        gateway, _gateway = _gateway, None
+    if gateway is not None:
+        gateway.close()
 
 
 def send_sms_notification(phone_number, message):
-    """Send an SMS notification using Africa's Talking API.
+    """Send an SMS notification through the shared gateway.
 
     Args:
         phone_number (str): The phone number to send the SMS to.
         message (str): The message to send.
 
     Returns:
-        dict: The response from the Africa's Talking API.
+        dict: The API's result for this recipient.
     """
-    username = settings.AFRICAS_TALKING_USERNAME
-    api_key = settings.AFRICAS_TALKING_API_KEY
-    sender_id = settings.AFRICAS_TALKING_SENDER_ID
-    africastalking.initialize(username=username, api_key=api_key)
-    sms = africastalking.SMS
-
-    try:
-        response = sms.send(message, [phone_number], sender_id=sender_id)
-        return response
-    except Exception as e:
-       raise e
\ No newline at end of file
+    return get_gateway().send(phone_number, message)
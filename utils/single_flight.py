@@ -0,0 +1,74 @@
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _key_lock(key):
+    """Per-process lock for one key, dropped once nobody is waiting on it"""
+    with _locks_guard:
+        entry = _locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _locks[key]
+
+
+def get_or_build(key, build, timeout, lock_timeout=10, poll_interval=0.05):
+    """Return a cached value, letting only one caller at a time build it on a miss.
+
+    Threads in a process queue on a local lock; across processes the builder
+    is elected with cache.add, and the others poll the cache until the value
+    appears or the lock expires.
+
+    Args:
+        key (str): The cache key.
+        build (callable): Produces the value. Returning None skips caching.
+        timeout (int): Seconds to keep the built value.
+        lock_timeout (int): Seconds before a stuck builder's lock is ignored.
+        poll_interval (float): Seconds between cache checks while waiting.
+
+    Returns:
+        The cached or freshly built value.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    with _key_lock(key):
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+        lock_key = f"{key}:building"
+        # The lock holds a token unique to this caller, so a build that outlives
+        # lock_timeout does not release a lock another builder has since taken
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + lock_timeout
+        while not cache.add(lock_key, token, timeout=lock_timeout):
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(poll_interval)
+            value = cache.get(key)
+            if value is not None:
+                return value
+
+        try:
+            value = build()
+            if value is not None:
+                cache.set(key, value, timeout=timeout)
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+        return value